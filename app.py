@@ -1,6 +1,19 @@
 import streamlit as st
+import io
+import os
+import tempfile
 import uuid
-from controller import StorageController, LLMController
+from dotenv import load_dotenv
+
+import profiling
+
+load_dotenv()
+
+# With KS_SERVICE_URL set the app is a thin client of service.py, otherwise it
+# runs the controllers in-process.
+SERVICE_URL = os.getenv("KS_SERVICE_URL")
+# Exports larger than this are written to a temporary file
+EXPORT_SPOOL_BYTES = 64 * 1024 * 1024
 
 DEFAULT_ID_KEY = "user_id"
 current_user_id = st.query_params.get(DEFAULT_ID_KEY, None)
@@ -18,13 +31,28 @@ if not current_user_id:
         )
 
 
+@st.cache_resource
+def get_service_client():
+    from service_client import ServiceClient
+
+    return ServiceClient(SERVICE_URL)
+
+
 @st.cache_resource
 def get_controller():
+    if SERVICE_URL:
+        return get_service_client()
+    from controller import StorageController
+
     return StorageController()
 
 
 @st.cache_resource
 def get_llm_controller():
+    if SERVICE_URL:
+        return get_service_client()
+    from controller import LLMController
+
     return LLMController()
 
 
@@ -63,6 +91,53 @@ def difficulty_flag(level: str) -> str:
     return {"easy": "🟢", "medium": "🟡", "hard": "🔴"}.get(level, "⚪️")
 
 
+def run_job(label: str, show_result, func, *args, **kwargs):
+    """Run an ingest, sync, import or clustering without holding up the page.
+
+    The service client only submits the job, which the sidebar job panel then
+    follows. In-process controllers run the call here, under a spinner.
+    """
+    if SERVICE_URL:
+        job_id = func(*args, **kwargs)
+        st.session_state.setdefault("jobs", []).append(
+            {"id": job_id, "label": label, "show_result": show_result}
+        )
+        st.info(f"⏳ {label} se izvodi u pozadini, stanje pratite u bočnoj traci.")
+        return
+    with st.spinner(f"{label}..."):
+        result = func(*args, **kwargs)
+    show_result(result)
+
+
+@st.fragment(run_every=2)
+def job_panel():
+    jobs = st.session_state.get("jobs", [])
+    if not jobs:
+        return
+    st.markdown("### ⏳ Poslovi")
+    for job in jobs:
+        if job.get("status") not in ("done", "failed"):
+            state = controller.get_job(job["id"])
+            job.update(
+                status=state["status"], result=state["result"], error=state["error"]
+            )
+        if job["status"] == "done":
+            job["show_result"](job["result"])
+        elif job["status"] == "failed":
+            st.error(f"❌ {job['label']}: {job['error']}")
+        else:
+            st.caption(f"⏳ {job['label']}...")
+    running = [job for job in jobs if job["status"] not in ("done", "failed")]
+    if len(running) < len(jobs) and st.button("Očisti završene poslove"):
+        st.session_state.jobs = running
+        st.rerun(scope="fragment")
+
+
+if SERVICE_URL:
+    with st.sidebar:
+        job_panel()
+
+
 # --- Shared language prefix input ---
 st.sidebar.markdown("### Postavke jezika (Wikipedija)")
 lang_prefix = st.sidebar.text_input("Opcionalni prefiks za jezik", value="en")
@@ -81,7 +156,11 @@ if page == "Unesi podatke s Wikipedije":
         )
         ingestion_mode = st.radio(
             "Način uveza",
-            options=["Uvezi ispočetka", "Dodaj na postojeće podatke"],
+            options=[
+                "Uvezi ispočetka",
+                "Dodaj na postojeće podatke",
+                "Sinkroniziraj s najnovijom revizijom",
+            ],
             index=0,
         )
         section_filter = st.text_input(
@@ -89,23 +168,33 @@ if page == "Unesi podatke s Wikipedije":
         )
         submitted = st.form_submit_button("Ingest")
 
-        if submitted:
-            with st.spinner("🔄 Ingesting and creating vector index..."):
-                mode = "replace" if ingestion_mode == "Uvezi ispočetka" else "append"
-                has_section_filter = (
-                    section_filter is not None and len(section_filter) > 0
-                )
-                method = "detailed" if has_section_filter else "quick"
-                section = section_filter
-                count = controller.ingest_wikipedia(
-                    user_id,
-                    category,
-                    save_as_category,
-                    lang_prefix,
-                    mode=mode,
-                    method=method,
-                    section_filter=section_filter if has_section_filter else None,
-                )
+        if submitted and ingestion_mode == "Sinkroniziraj s najnovijom revizijom":
+
+            def show_sync(result, category=category):
+                if result is None:
+                    st.warning(f"Stranica '{category}' nije pronađena.")
+                else:
+                    st.success(
+                        f"✅ Dodano {result['added']}, obrisano {result['removed']}, "
+                        f"nepromijenjeno {result['unchanged']} paragrafa."
+                    )
+
+            run_job(
+                f"🔄 Sinkronizacija '{category}'",
+                show_sync,
+                controller.sync_wikipedia,
+                user_id,
+                category,
+                save_as_category,
+                lang_prefix,
+                section_filter=section_filter or None,
+            )
+        elif submitted:
+            mode = "replace" if ingestion_mode == "Uvezi ispočetka" else "append"
+            has_section_filter = section_filter is not None and len(section_filter) > 0
+            method = "detailed" if has_section_filter else "quick"
+
+            def show_ingest(count, category=category, mode=mode):
                 if count is not None:
                     verb = "Zamijenjeno" if mode == "replace" else "Dodano"
                     st.success(
@@ -116,6 +205,19 @@ if page == "Unesi podatke s Wikipedije":
                         f"✅ Paragrafi u kategoriji '{category}' već postoje u spremniku!"
                     )
 
+            run_job(
+                f"🔄 Uvoz '{category}' s Wikipedije",
+                show_ingest,
+                controller.ingest_wikipedia,
+                user_id,
+                category,
+                save_as_category,
+                lang_prefix,
+                mode=mode,
+                method=method,
+                section_filter=section_filter if has_section_filter else None,
+            )
+
 # ==============================
 # ✍️ Unesi podatke sam
 # ==============================
@@ -156,15 +258,18 @@ elif page == "Unesi podatke sam":
                     mode = (
                         "replace" if ingestion_mode == "Uvezi ispočetka" else "append"
                     )
-                    with st.spinner("Kodiranje i spremanje..."):
-                        count = controller.ingest_custom_text(
-                            user_id,
-                            target_label,
-                            user_paragraph,
-                            lang_prefix=lang_prefix,
-                            mode=mode,
-                        )
-                        st.success(f"✅ Uneseno {count} paragrafa u '{target_label}'.")
+                    run_job(
+                        f"Kodiranje i spremanje u '{target_label}'",
+                        lambda count, label=target_label: st.success(
+                            f"✅ Uneseno {count} paragrafa u '{label}'."
+                        ),
+                        controller.ingest_custom_text,
+                        user_id,
+                        target_label,
+                        user_paragraph,
+                        lang_prefix=lang_prefix,
+                        mode=mode,
+                    )
 
 # ==============================
 # 📊 Pregledaj podatke
@@ -196,6 +301,53 @@ elif page == "Pregledaj podatke":
                         with st.expander(f"📄 Paragraf {i+1}", expanded=False):
                             st.markdown(item["content"])
 
+        st.subheader("🧩 Teme")
+        if st.button("🧩 Grupiraj po temama"):
+
+            def show_clusters(result):
+                if result:
+                    st.success(
+                        f"✅ {result['paragraphs']} paragrafa grupirano u {result['clusters']} tema."
+                    )
+
+            run_job(
+                f"Grupiranje '{selected_category}' po temama",
+                show_clusters,
+                controller.cluster_category,
+                user_id,
+                selected_category,
+            )
+
+        clusters = controller.get_clusters(user_id, selected_category)
+        if not clusters:
+            st.info("ℹ️ Kategorija još nije grupirana po temama.")
+        else:
+            cluster = st.selectbox(
+                "Odaberi temu:",
+                options=clusters,
+                format_func=lambda c: (
+                    f"Nerazvrstano ({c['size']})"
+                    if c["cluster"] < 0
+                    else f"{c['preview'][:80]}… ({c['size']})"
+                ),
+            )
+            page_size = 20
+            pages = max(1, -(-cluster["size"] // page_size))
+            cluster_page = st.number_input(
+                f"Stranica (1-{pages}):", min_value=1, max_value=pages, value=1
+            )
+            paragraphs = controller.get_cluster_paragraphs(
+                user_id,
+                selected_category,
+                cluster["cluster"],
+                page=cluster_page - 1,
+                page_size=page_size,
+            )
+            offset = (cluster_page - 1) * page_size
+            for i, item in enumerate(paragraphs):
+                with st.expander(f"📄 Paragraf {offset + i + 1}", expanded=False):
+                    st.markdown(item["content"])
+
 # ==============================
 # 📦 Izvezi podatke
 # ==============================
@@ -228,6 +380,60 @@ elif page == "Izvezi podatke":
                         mime="text/plain",
                     )
 
+        st.markdown("---")
+        st.subheader("🗄️ Sigurnosna kopija s vektorima")
+        export_all = st.checkbox("Izvezi sve kategorije")
+        if st.button("📤 Izvezi kao .arrow datoteku"):
+            with st.spinner("Izvoz paragrafa i vektora..."):
+                export_categories = (
+                    available_categories if export_all else [selected_category]
+                )
+                # Spills to disk instead of growing one buffer for a large export
+                sink = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+                rows = controller.export_categories(user_id, export_categories, sink)
+                if not rows:
+                    st.warning("Nismo pronašli paragrafe za izvoz.")
+                else:
+                    file_name = "sve" if export_all else selected_category
+                    sink.seek(0)
+                    st.download_button(
+                        label=f"📥 Download Arrow File ({rows} paragrafa)",
+                        data=sink,
+                        file_name=f"{file_name}.arrow",
+                        mime="application/vnd.apache.arrow.stream",
+                    )
+
+    st.markdown("---")
+    st.subheader("📥 Uvezi sigurnosnu kopiju")
+    uploaded_file = st.file_uploader("Odaberi .arrow datoteku:", type=["arrow"])
+    import_category = st.text_input(
+        "Spremi sve u kategoriju (ostavi prazno za izvorne kategorije):"
+    )
+    import_mode = st.radio(
+        "Način uveza",
+        options=["Uvezi ispočetka", "Dodaj na postojeće podatke"],
+        index=0,
+        key="import_mode",
+    )
+    if uploaded_file is not None and st.button("📥 Uvezi"):
+
+        def show_import(imported):
+            for category, rows in imported.items():
+                st.success(f"✅ Uvezeno {rows} paragrafa u '{category}'.")
+
+        try:
+            run_job(
+                "Uvoz paragrafa",
+                show_import,
+                controller.import_paragraphs,
+                user_id,
+                io.BytesIO(uploaded_file.getvalue()),
+                mode="replace" if import_mode == "Uvezi ispočetka" else "append",
+                category=import_category or None,
+            )
+        except Exception as e:
+            st.error(f"❌ Uvoz nije uspio: {e}")
+
 # ==============================
 # 💬 Chat With Your Knowledge (Chatbot)
 # ==============================
@@ -243,6 +449,15 @@ elif page == "ChatBot":
             options=available_categories,
         )
 
+        context_window = st.slider(
+            "Proširi pogotke susjednim paragrafima",
+            min_value=0,
+            max_value=3,
+            value=1,
+        )
+        # Neighbouring paragraphs already widen every hit, so fewer hits are needed
+        number_of_hits = 10 if context_window == 0 else 5
+
         # Initialize chat history in session
         if "chat_history" not in st.session_state:
             st.session_state.chat_history = []
@@ -260,17 +475,37 @@ elif page == "ChatBot":
                 {"role": "user", "content": user_input}
             )
 
-            # Semantic search
-            with st.spinner("🔍 Dohvaćanje relevantnog znanja..."):
-                context = controller.get_similar_documents(
-                    user_id, category, user_input, 10
-                )
+            if SERVICE_URL:
+                # One request, so the service profiles the whole chat turn
+                with st.spinner("🧠 Dohvaćanje znanja i odgovora..."):
+                    reply = controller.chat(
+                        user_id,
+                        category,
+                        user_input,
+                        number_of_hits,
+                        context_window,
+                        lang_prefix,
+                    )
+                context, answer = reply["context"], reply["answer"]
+            else:
+                with profiling.profile_query(
+                    "chat", user_id=user_id, category=category
+                ):
+                    # Semantic search
+                    with st.spinner("🔍 Dohvaćanje relevantnog znanja..."):
+                        context = controller.get_similar_documents(
+                            user_id,
+                            category,
+                            user_input,
+                            number_of_hits,
+                            context_window,
+                        )
 
-            # Generate answer
-            with st.spinner("🧠 GPT-4o misli..."):
-                answer = llm_controller.answer_question_based_on_excerpts(
-                    user_id, user_input, context, lang_prefix
-                )
+                    # Generate answer
+                    with st.spinner("🧠 GPT-4o misli..."):
+                        answer = llm_controller.answer_question_based_on_excerpts(
+                            user_id, user_input, context, lang_prefix
+                        )
 
             # Display bot response
             st.chat_message("assistant").markdown(answer)
@@ -284,6 +519,35 @@ elif page == "ChatBot":
                     st.markdown(f"**Excerpt {i+1}:**")
                     st.markdown(excerpt)
 
+    with st.expander("🛠️ Spori upiti (admin)"):
+        # Checked against KS_ADMIN_TOKEN by the controller or the service
+        admin_token = st.text_input("Administratorski token", type="password")
+        slow_queries = []
+        if admin_token:
+            try:
+                slow_queries = controller.get_slow_queries(admin_token, 50)
+            except PermissionError:
+                st.error("❌ Neispravan administratorski token.")
+                admin_token = None
+        if admin_token:
+            if not slow_queries:
+                st.info(
+                    "ℹ️ Nema zabilježenih sporih upita. Profiliranje se uključuje s KS_PROFILE=1."
+                )
+            for record in slow_queries:
+                stages = ", ".join(
+                    f"{name} {ms:.0f} ms" for name, ms in record["stages"].items()
+                )
+                st.markdown(
+                    f"**{record['time']}** · {record['name']} · "
+                    f"{record['total_ms']:.0f} ms · {record.get('category', '')} "
+                    f"({record.get('paragraphs', '?')} paragrafa, "
+                    f"{record.get('index_type', '?')})"
+                )
+                st.caption(stages or "Bez razrade po fazama.")
+                if record.get("profile"):
+                    st.code(record["profile"], language="text")
+
 
 # ==============================
 # 🧠 Generiraj kviz
@@ -303,6 +567,13 @@ elif page == "Generiraj kviz":
             "Na koji način bi htjeli da se GPT fokusira na pitanje (na engleskom) ?",
             value="No specific kind.",
         )
+        diverse = st.checkbox(
+            "Raznolika pitanja (paragrafi iz različitih dijelova kategorije)"
+        )
+        seed = st.text_input(
+            "Sjeme (isto sjeme uvijek odabere iste paragrafe, ostavi prazno za nasumično)",
+            value="",
+        )
 
         if st.button("🎲 Generate Pub Quiz"):
             with st.spinner("Odabir paragrafa i generiranje pub kviza..."):
@@ -312,6 +583,8 @@ elif page == "Generiraj kviz":
                     number_of_questions,
                     lang_prefix,
                     better_explanation,
+                    diverse=diverse,
+                    seed=int(seed) if seed.strip().isdigit() else None,
                 )
                 if quiz is None:
                     st.warning("Nismo uspjeli generirati kviz!")
@@ -0,0 +1,98 @@
+"""Import-time profile of the app's modules, based on ``python -X importtime``.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time controller service
+    python -m benchmarks.import_time controller --construct
+
+Each module is imported in a fresh interpreter so earlier imports do not hide
+its cost. The report lists the packages each module pulls in, slowest first.
+``--construct`` also times building the controllers, which is what Streamlit
+waits for before the first page renders.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+CONSTRUCT = """
+import time
+started = time.perf_counter()
+from controller import LLMController, StorageController
+imported = time.perf_counter()
+StorageController()
+LLMController()
+print(f"{imported - started:.3f} {time.perf_counter() - imported:.3f}")
+"""
+
+
+def parse_importtime(stderr: str, module: str):
+    """Return the total import time of ``module`` and self time per package.
+
+    ``-X importtime`` prints imports in post-order, so everything ``module``
+    pulled in is listed between the previous top-level import and its own line.
+    Interpreter start-up (``site``, ``encodings``) is left out that way.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name, int(self_us), int(cumulative_us)))
+
+    end = max(i for i, row in enumerate(rows) if row[0].strip() == module)
+    start = max(
+        [i for i, row in enumerate(rows[:end]) if not row[0].startswith("  ")],
+        default=-1,
+    )
+    packages = {}
+    for name, self_us, _ in rows[start + 1 : end + 1]:
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return rows[end][2], packages
+
+
+def profile_module(module: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr, module)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=["controller"])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--construct", action="store_true", help="Also time building the controllers"
+    )
+    args = parser.parse_args()
+
+    for module in args.modules:
+        total_us, packages = profile_module(module)
+        print(f"\nimport {module}: {total_us / 1e6:.3f}s")
+        print(f"{'self ms':>9}  package")
+        for package, self_us in sorted(
+            packages.items(), key=lambda item: item[1], reverse=True
+        )[: args.top]:
+            print(f"{self_us / 1e3:>9.1f}  {package}")
+
+    if args.construct:
+        result = subprocess.run(
+            [sys.executable, "-c", CONSTRUCT], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        imported, constructed = result.stdout.split()[-2:]
+        print(f"\nimport controller: {imported}s")
+        print(f"construct controllers: {constructed}s")
+
+
+if __name__ == "__main__":
+    main()
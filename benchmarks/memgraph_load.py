@@ -0,0 +1,84 @@
+"""Load test for MemgraphStorage against a local Memgraph.
+
+Start Memgraph with vector search first, for example:
+
+    docker run -p 7687:7687 memgraph/memgraph-mage
+
+and run from the repository root:
+
+    python -m benchmarks.memgraph_load --sessions 1 2 4 8 16
+
+Each session is a thread sharing one MemgraphStorage, the same way Streamlit
+sessions share the storage from ``st.cache_resource``.
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from memgraph_storage import MemgraphStorage
+
+CATEGORY = "LoadTest"
+
+
+def run_sessions(storage, sessions: int, queries: int, dimension: int, n: int):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((sessions, dimension)).astype("float32")
+    peak_utilization = [0.0]
+
+    def session(i):
+        for _ in range(queries):
+            query_vector = vectors[i].tolist()
+            storage.get_similar_documents("load-test", CATEGORY, query_vector, n)
+            utilization = storage.get_pool_stats()["utilization"]
+            peak_utilization[0] = max(peak_utilization[0], utilization)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sessions * queries / elapsed, peak_utilization[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("-n", type=int, default=10)
+    args = parser.parse_args()
+
+    storage = MemgraphStorage()
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((args.paragraphs, args.dimension)).astype(
+        "float32"
+    )
+    paragraphs = [f"Load test paragraph {i}" for i in range(args.paragraphs)]
+    storage.ingest_paragraphs(
+        "load-test", CATEGORY, paragraphs, embeddings, "en", "replace"
+    )
+
+    print(f"{'sessions':>8} {'queries/s':>10} {'speedup':>8} {'peak util':>10}")
+    baseline = None
+    for sessions in args.sessions:
+        throughput, utilization = run_sessions(
+            storage, sessions, args.queries, args.dimension, args.n
+        )
+        baseline = baseline or throughput
+        print(
+            f"{sessions:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x"
+            f" {utilization:>10.0%}"
+        )
+    print("Pool:", storage.get_pool_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Conformance and performance checks shared by every Storage backend.
+
+Run from the repository root:
+
+    python -m benchmarks.storage_conformance --backends faiss --sizes 1000 10000
+
+Memgraph needs a running server (see ``benchmarks/memgraph_load.py``). Every
+backend goes through the same correctness checks at every size, then its
+ingest throughput and search latency are compared against the budgets. The
+script exits non-zero when a check fails or a budget is missed, so it can gate
+a CI job the same way a test suite would. ``pytest`` runs the same checks
+through ``tests/test_storage_conformance.py``, the budgets scaled down to its
+small sizes, the timed ones under the ``perf`` marker.
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from storage import SimilarDocument, Storage
+
+# Per-backend budgets at BUDGET_SIZE rows, overridable from the command line
+BUDGET_SIZE = 10000
+BUDGETS = {
+    "faiss": {"ingest_rows_per_s": 5000, "search_p95_ms": 50, "context_p95_ms": 100},
+    "memgraph": {
+        "ingest_rows_per_s": 1000,
+        "search_p95_ms": 100,
+        "context_p95_ms": 200,
+    },
+}
+
+
+def make_storage(backend: str) -> Storage:
+    if backend == "faiss":
+        from faiss_storage import FaissStorage
+
+        return FaissStorage(index_dir=tempfile.mkdtemp(prefix="ks-conformance-"))
+    if backend == "memgraph":
+        from memgraph_storage import MemgraphStorage
+
+        return MemgraphStorage()
+    raise ValueError(f"Unknown backend '{backend}'")
+
+
+def make_vectors(rng, count: int, dimension: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dimension)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class Checker:
+    def __init__(self, label: str):
+        self.label = label
+        self.failures = []
+
+    def check(self, condition: bool, message: str):
+        if not condition:
+            self.failures.append(f"{self.label}: {message}")
+
+
+def check_correctness(storage: Storage, checker: Checker, size: int, dimension: int):
+    rng = np.random.default_rng(size)
+    user_id = f"conformance-{uuid.uuid4().hex[:8]}"
+    category = "Conformance"
+    first_run = size // 2
+    paragraphs = [f"Paragraph {i}" for i in range(size)]
+    vectors = make_vectors(rng, size, dimension)
+
+    storage.initialize_user(user_id)
+    check = checker.check
+    check(
+        storage.ingest_paragraphs(
+            user_id,
+            category,
+            paragraphs[:first_run],
+            vectors[:first_run],
+            "en",
+            "replace",
+        )
+        == first_run,
+        "replace ingest did not return its paragraph count",
+    )
+    storage.ingest_paragraphs(
+        user_id, category, paragraphs[first_run:], vectors[first_run:], "en", "append"
+    )
+
+    check(category in storage.get_all_categories(user_id), "category not listed")
+    ids = storage.get_paragraph_ids(user_id, category)
+    check(len(ids) == size, f"expected {size} ids, got {len(ids)}")
+    stored = storage.get_all_paragraphs(user_id, category)
+    check(
+        [p["content"] for p in stored] == paragraphs,
+        "paragraphs are not returned in ingest order",
+    )
+    check([p["id"] for p in stored] == ids, "ids differ from get_all_paragraphs")
+
+    target = size // 4
+    hits = storage.get_similar_documents(user_id, category, vectors[target], 5)
+    check(bool(hits), "search returned nothing")
+    if hits:
+        check(
+            set(SimilarDocument.__annotations__) <= set(hits[0]),
+            f"search result keys {sorted(hits[0])} miss SimilarDocument fields",
+        )
+        check(hits[0]["content"] == paragraphs[target], "exact vector not ranked first")
+
+    passages = storage.get_similar_documents_with_context(
+        user_id, category, vectors[target], 1, 1
+    )
+    check(
+        bool(passages) and passages[0]["ids"] == ids[target - 1 : target + 2],
+        "context window is not the hit and its two neighbours",
+    )
+    # The first paragraph of the appended run has no link to the previous run
+    passages = storage.get_similar_documents_with_context(
+        user_id, category, vectors[first_run], 1, 1
+    )
+    check(
+        bool(passages) and passages[0]["ids"] == ids[first_run : first_run + 2],
+        "context window crossed an ingest boundary",
+    )
+
+    records = [
+        record
+        for batch in storage.iter_paragraph_records(user_id, category, 256)
+        for record in batch
+    ]
+    check([r["id"] for r in records] == ids, "exported ids differ from stored ids")
+    check(
+        sum(bool(r["run_start"]) for r in records) == 2,
+        "export did not mark exactly two runs",
+    )
+    check(
+        bool(records) and len(records[0]["vector"]) == dimension,
+        "exported vectors have the wrong dimension",
+    )
+
+    sample = storage.sample_n_connected_paragraphs(user_id, category, 3)
+    check(bool(sample) and "content" in sample[0], "sampling returned nothing")
+    check(
+        storage.sample_n_connected_paragraphs(user_id, "Missing", 3) is None,
+        "sampling an empty category did not return None",
+    )
+
+    storage.delete_paragraph(user_id, category, ids[target])
+    check(
+        ids[target] not in storage.get_paragraph_ids(user_id, category),
+        "deleted paragraph is still listed",
+    )
+    hits = storage.get_similar_documents(user_id, category, vectors[target], 1)
+    check(
+        not hits or hits[0]["content"] != paragraphs[target],
+        "deleted paragraph is still searchable",
+    )
+
+    doomed = [ids[target + 1], ids[target + 2], "missing-id"]
+    check(
+        storage.delete_paragraphs(user_id, category, doomed) == 2,
+        "batch delete did not report the two existing paragraphs",
+    )
+    check(
+        len(storage.get_paragraph_ids(user_id, category)) == size - 3,
+        "batch delete did not remove the paragraphs",
+    )
+    passages = storage.get_similar_documents_with_context(
+        user_id, category, vectors[target + 3], 1, 1
+    )
+    check(
+        bool(passages) and passages[0]["ids"][0] == ids[target - 1],
+        "context window does not bridge over deleted paragraphs",
+    )
+
+    stats = storage.describe_category(user_id, category)
+    check(
+        bool(stats) and stats["paragraphs"] == size - 3 and bool(stats["index_type"]),
+        "category stats do not count the live paragraphs",
+    )
+
+    state = {"sources": {"en:Page:": {"revid": 7, "ids": ids[:2]}}}
+    storage.set_sync_state(user_id, category, state)
+    check(
+        storage.get_sync_state(user_id, category) == state,
+        "sync state did not round-trip",
+    )
+
+    live_ids = storage.get_paragraph_ids(user_id, category)
+    assignments = {paragraph_id: i % 2 for i, paragraph_id in enumerate(live_ids)}
+    storage.save_clusters(
+        user_id, category, vectors[:2], assignments, [live_ids[0], live_ids[1]]
+    )
+    clusters = storage.get_clusters(user_id, category) or []
+    check(
+        [(c["cluster"], c["size"]) for c in clusters]
+        == [(0, (len(live_ids) + 1) // 2), (1, len(live_ids) // 2)],
+        "cluster sizes do not match the saved assignments",
+    )
+    check(
+        bool(clusters) and clusters[0]["preview"] == stored[0]["content"],
+        "cluster preview is not its representative paragraph",
+    )
+    members = storage.get_cluster_paragraphs(user_id, category, 1, 1, 2)
+    check(
+        [p["id"] for p in members] == live_ids[3:6:2],
+        "cluster paragraphs are not paged in stored order",
+    )
+
+    storage.ingest_paragraphs(
+        user_id, category, paragraphs[:3], vectors[:3], "en", "replace"
+    )
+    check(
+        len(storage.get_paragraph_ids(user_id, category)) == 3,
+        "replace did not drop the previous paragraphs",
+    )
+    check(
+        storage.get_clusters(user_id, category) is None,
+        "replace did not drop the previous clusters",
+    )
+    check(
+        storage.get_sync_state(user_id, category) is None,
+        "replace did not drop the previous sync state",
+    )
+
+
+def scaled_budgets(backend: str, size: int) -> dict:
+    """Budgets for ``size`` rows, search time grows about linearly with it.
+
+    Fixed per-call costs dominate small categories, so a tenth of the budget is
+    the least any size gets.
+    """
+    scale = max(size / BUDGET_SIZE, 0.1)
+    budgets = BUDGETS[backend]
+    return {
+        "ingest_rows_per_s": budgets["ingest_rows_per_s"] * min(scale, 1.0),
+        "search_p95_ms": budgets["search_p95_ms"] * scale,
+        "context_p95_ms": budgets["context_p95_ms"] * scale,
+    }
+
+
+def check_budgets(stats: dict, budgets: dict, checker: Checker):
+    checker.check(
+        stats["ingest_rows_per_s"] >= budgets["ingest_rows_per_s"],
+        f"ingest {stats['ingest_rows_per_s']:.0f} rows/s is below"
+        f" {budgets['ingest_rows_per_s']}",
+    )
+    for key in ("search_p95_ms", "context_p95_ms"):
+        checker.check(
+            stats[key] <= budgets[key],
+            f"{key} {stats[key]:.2f} is above {budgets[key]}",
+        )
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(storage: Storage, size: int, dimension: int, queries: int):
+    rng = np.random.default_rng(size + 1)
+    user_id = f"performance-{uuid.uuid4().hex[:8]}"
+    category = "Performance"
+    vectors = make_vectors(rng, size, dimension)
+    paragraphs = [f"Paragraph {i}" for i in range(size)]
+    query_vectors = make_vectors(rng, queries, dimension)
+
+    started = time.perf_counter()
+    storage.ingest_paragraphs(user_id, category, paragraphs, vectors, "en", "replace")
+    ingest_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    storage.get_similar_documents(user_id, category, query_vectors[0], 10)
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    def latencies(search):
+        timings = []
+        for query_vector in query_vectors:
+            started = time.perf_counter()
+            search(query_vector)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    search = latencies(
+        lambda q: storage.get_similar_documents(user_id, category, q, 10)
+    )
+    context = latencies(
+        lambda q: storage.get_similar_documents_with_context(
+            user_id, category, q, 5, 2
+        )
+    )
+    return {
+        "ingest_rows_per_s": size / ingest_seconds,
+        "cold_ms": cold_ms,
+        "search_p50_ms": statistics.median(search),
+        "search_p95_ms": percentile(search, 0.95),
+        "context_p95_ms": percentile(context, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["faiss"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--min-ingest-rows-per-s", type=float)
+    parser.add_argument("--max-search-p95-ms", type=float)
+    parser.add_argument("--max-context-p95-ms", type=float)
+    parser.add_argument(
+        "--no-budgets", action="store_true", help="Report timings without failing"
+    )
+    args = parser.parse_args()
+
+    failures = []
+    print(
+        f"{'backend':>9} {'size':>7} {'ingest/s':>10} {'cold ms':>8}"
+        f" {'p50 ms':>7} {'p95 ms':>7} {'ctx p95':>8}"
+    )
+    for backend in args.backends:
+        storage = make_storage(backend)
+        budgets = dict(BUDGETS[backend])
+        if args.min_ingest_rows_per_s is not None:
+            budgets["ingest_rows_per_s"] = args.min_ingest_rows_per_s
+        if args.max_search_p95_ms is not None:
+            budgets["search_p95_ms"] = args.max_search_p95_ms
+        if args.max_context_p95_ms is not None:
+            budgets["context_p95_ms"] = args.max_context_p95_ms
+
+        for size in args.sizes:
+            checker = Checker(f"{backend}/{size}")
+            check_correctness(storage, checker, size, args.dimension)
+
+            stats = measure(storage, size, args.dimension, args.queries)
+            print(
+                f"{backend:>9} {size:>7} {stats['ingest_rows_per_s']:>10.0f}"
+                f" {stats['cold_ms']:>8.1f} {stats['search_p50_ms']:>7.2f}"
+                f" {stats['search_p95_ms']:>7.2f} {stats['context_p95_ms']:>8.2f}"
+            )
+            if not args.no_budgets:
+                check_budgets(stats, budgets, checker)
+            failures.extend(checker.failures)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ All storage checks passed")
+
+
+if __name__ == "__main__":
+    main()
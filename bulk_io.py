@@ -0,0 +1,177 @@
+"""Arrow IPC export and import of stored paragraphs together with their vectors.
+
+A file holds one or more categories as a stream of record batches. Every row
+carries the paragraph ID, its position, whether it starts a run of connected
+paragraphs, the content, ``lang_prefix``, the section path and the embedding as
+a fixed-size float32 list. Importing feeds the stored vectors straight back to
+``ingest_paragraphs``, so restores and migrations between ``FaissStorage`` and
+``MemgraphStorage`` need no model inference.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import io
+
+import numpy as np
+import pyarrow as pa
+
+FORMAT_NAME = b"ks-paragraphs"
+FORMAT_VERSION = b"1"
+BATCH_SIZE = 1024
+# A single run longer than this is split into several ingests on import
+MAX_RUN_ROWS = 50_000
+
+
+def paragraph_schema(dimension: int) -> pa.Schema:
+    return pa.schema(
+        [
+            ("category", pa.string()),
+            ("id", pa.string()),
+            ("position", pa.int64()),
+            ("run_start", pa.bool_()),
+            ("content", pa.string()),
+            ("lang_prefix", pa.string()),
+            ("section", pa.string()),
+            ("embedding", pa.list_(pa.float32(), dimension)),
+        ],
+        metadata={
+            b"format": FORMAT_NAME,
+            b"version": FORMAT_VERSION,
+            b"dimension": str(dimension).encode(),
+        },
+    )
+
+
+def _to_batch(schema: pa.Schema, category: str, records: List[Dict]):
+    dimension = schema.field("embedding").type.list_size
+    vectors = np.asarray([r["vector"] for r in records], dtype="float32")
+    embeddings = pa.FixedSizeListArray.from_arrays(
+        pa.array(vectors.reshape(-1), type=pa.float32()), dimension
+    )
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([category] * len(records), type=pa.string()),
+            pa.array([r["id"] for r in records], type=pa.string()),
+            pa.array([r["position"] for r in records], type=pa.int64()),
+            pa.array([r["run_start"] for r in records], type=pa.bool_()),
+            pa.array([r["content"] for r in records], type=pa.string()),
+            pa.array([r["lang_prefix"] for r in records], type=pa.string()),
+            pa.array([r.get("section") for r in records], type=pa.string()),
+            embeddings,
+        ],
+        schema=schema,
+    )
+
+
+def _export_chunks(
+    storage, user_id: str, categories: Iterable[str]
+) -> Iterator[Tuple[int, bytes]]:
+    # The stream is written into a small buffer that is drained after every
+    # record batch, so at most one batch is held in memory
+    buffer = io.BytesIO()
+    writer = None
+    for category in categories:
+        batches = storage.iter_paragraph_records(user_id, category, BATCH_SIZE)
+        for records in batches:
+            if not records:
+                continue
+            if writer is None:
+                schema = paragraph_schema(len(records[0]["vector"]))
+                writer = pa.ipc.new_stream(buffer, schema)
+            writer.write_batch(_to_batch(schema, category, records))
+            yield len(records), buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if writer is not None:
+        writer.close()
+        yield 0, buffer.getvalue()
+
+
+def iter_export(storage, user_id: str, categories: Iterable[str]) -> Iterator[bytes]:
+    """Yield the Arrow IPC stream of the given categories chunk by chunk."""
+    for _, data in _export_chunks(storage, user_id, categories):
+        yield data
+
+
+def export_categories(storage, user_id: str, categories: Iterable[str], sink) -> int:
+    """Stream the given categories into ``sink`` and return the row count."""
+    rows = 0
+    for count, data in _export_chunks(storage, user_id, categories):
+        sink.write(data)
+        rows += count
+    return rows
+
+
+def _iter_runs(reader, category_override: Optional[str]) -> Iterator[Dict]:
+    # Rows are regrouped into runs of connected paragraphs, each run becomes
+    # one ingest so the backends link it the same way as the original.
+    run = None
+    for batch in reader:
+        columns = batch.to_pydict()
+        # Files written before sections were exported have no such column
+        sections = columns.get("section") or [None] * batch.num_rows
+        embeddings = (
+            batch.column("embedding")
+            .flatten()
+            .to_numpy(zero_copy_only=False)
+            .reshape(batch.num_rows, -1)
+        )
+        for i in range(batch.num_rows):
+            category = category_override or columns["category"][i]
+            starts_run = (
+                run is None
+                or columns["run_start"][i]
+                or run["category"] != category
+                or len(run["ids"]) >= MAX_RUN_ROWS
+            )
+            if starts_run:
+                if run is not None:
+                    yield run
+                run = {
+                    "category": category,
+                    "lang_prefix": columns["lang_prefix"][i],
+                    "ids": [],
+                    "sections": [],
+                    "paragraphs": [],
+                    "vectors": [],
+                }
+            run["ids"].append(columns["id"][i])
+            run["sections"].append(sections[i])
+            run["paragraphs"].append(columns["content"][i])
+            run["vectors"].append(embeddings[i])
+    if run is not None:
+        yield run
+
+
+def import_paragraphs(
+    storage,
+    user_id: str,
+    source,
+    mode: str = "replace",
+    category: Optional[str] = None,
+    sanitize=lambda name: name,
+) -> Dict[str, int]:
+    """Load an export back into ``storage``, returning rows per category.
+
+    ``mode`` applies to the first run of every category, later runs append.
+    ``category`` renames everything in the file to a single target category.
+    """
+    reader = pa.ipc.open_stream(source)
+    if (reader.schema.metadata or {}).get(b"format") != FORMAT_NAME:
+        raise ValueError("Not a paragraph export file")
+
+    imported: Dict[str, int] = {}
+    for run in _iter_runs(reader, category):
+        target = sanitize(run["category"])
+        storage.ingest_paragraphs(
+            user_id,
+            target,
+            run["paragraphs"],
+            np.vstack(run["vectors"]),
+            run["lang_prefix"],
+            mode if target not in imported else "append",
+            ids=run["ids"],
+            sections=run["sections"],
+        )
+        imported[target] = imported.get(target, 0) + len(run["ids"])
+    return imported
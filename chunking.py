@@ -0,0 +1,187 @@
+"""Section-aware chunking of Wikipedia pages.
+
+A page is a tree of ``{"title", "text", "sections"}`` dicts, built from a
+``wikipediaapi`` page by ``page_tree`` or from plain text with ``== Heading ==``
+lines by ``parse_headings``. ``iter_chunks`` walks the tree in document order
+and yields ``(section_path, chunk)`` pairs. Paragraphs shorter than
+``min_tokens`` are merged with the ones after them, and paragraphs longer than
+``max_tokens`` are split on sentence boundaries. Chunks never cross sections.
+"""
+
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Paragraphs shorter than this are captions and list debris, never stored
+MIN_PARAGRAPH_LENGTH = 40
+# The embedding model reads 256 word pieces including [CLS] and [SEP]
+MAX_TOKENS = 254
+MIN_TOKENS = 64
+TOKENIZER_PATH = "local_model/tokenizer.json"
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+HEADING = re.compile(r"^(={2,6})\s*(.*?)\s*\1\s*$")
+
+
+class TokenCounter:
+    """Counts word pieces with the embedding model's own tokenizer.
+
+    Falls back to counting words and punctuation when ``tokenizers`` or the
+    tokenizer file is not available, which slightly undercounts.
+    """
+
+    def __init__(self, tokenizer_path: str = TOKENIZER_PATH):
+        self.tokenizer_path = tokenizer_path
+        self._tokenizer = None
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            from tokenizers import Tokenizer
+        except ImportError:
+            return
+        if os.path.exists(self.tokenizer_path):
+            tokenizer = Tokenizer.from_file(self.tokenizer_path)
+            # The saved tokenizer pads and truncates to the model input size
+            tokenizer.no_padding()
+            tokenizer.no_truncation()
+            self._tokenizer = tokenizer
+
+    def __call__(self, text: str) -> int:
+        if not self._loaded:
+            self._load()
+        if self._tokenizer is None:
+            return len(re.findall(r"\w+|[^\w\s]", text))
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+_default_counter = TokenCounter()
+
+
+def page_tree(page) -> Dict:
+    """Copy a ``wikipediaapi`` page or section into a plain dict tree."""
+    # A page's text already includes every section, its own part is the summary
+    text = page.summary if hasattr(page, "summary") else page.text
+    root = {"title": page.title, "text": text, "sections": []}
+    stack = [(page, root)]
+    while stack:
+        node, tree = stack.pop()
+        for section in node.sections:
+            child = {"title": section.title, "text": section.text, "sections": []}
+            tree["sections"].append(child)
+            stack.append((section, child))
+    return root
+
+
+def parse_headings(title: str, text: str) -> Dict:
+    """Build a page tree from plain text with ``== Heading ==`` section lines."""
+    root = {"title": title, "text": "", "sections": []}
+    lines = {id(root): []}
+    # (level, node) from the page down to the section currently being filled
+    open_sections = [(1, root)]
+    for line in text.split("\n"):
+        match = HEADING.match(line.strip())
+        if not match:
+            lines[id(open_sections[-1][1])].append(line)
+            continue
+        level = len(match.group(1))
+        while open_sections[-1][0] >= level:
+            open_sections.pop()
+        section = {"title": match.group(2), "text": "", "sections": []}
+        open_sections[-1][1]["sections"].append(section)
+        open_sections.append((level, section))
+        lines[id(section)] = []
+
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node["text"] = "\n".join(lines[id(node)])
+        stack.extend(node["sections"])
+    return root
+
+
+def find_section(tree: Dict, title: str) -> Optional[Tuple[Tuple[str, ...], Dict]]:
+    """Return the path and subtree of the first section titled ``title``."""
+    stack = [((), section) for section in reversed(tree["sections"])]
+    while stack:
+        path, node = stack.pop()
+        path = path + (node["title"],)
+        if node["title"].lower() == title.lower():
+            return path, node
+        stack.extend((path, section) for section in reversed(node["sections"]))
+    return None
+
+
+def _split(paragraph: str, count, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    tokens = count(paragraph)
+    if tokens <= max_tokens:
+        yield paragraph, tokens
+        return
+
+    piece, piece_tokens = [], 0
+    for sentence in SENTENCE_END.split(paragraph):
+        sentence_tokens = count(sentence)
+        if sentence_tokens > max_tokens:
+            # A single run-on sentence is cut between words
+            parts = [(word, count(word)) for word in sentence.split()]
+        else:
+            parts = [(sentence, sentence_tokens)]
+        for text, text_tokens in parts:
+            if piece and piece_tokens + text_tokens > max_tokens:
+                yield " ".join(piece), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(text)
+            piece_tokens += text_tokens
+    if piece:
+        yield " ".join(piece), piece_tokens
+
+
+def iter_chunks(
+    tree: Dict,
+    section_filter: Optional[str] = None,
+    max_tokens: int = MAX_TOKENS,
+    min_tokens: int = MIN_TOKENS,
+    count=None,
+) -> Iterator[Tuple[Tuple[str, ...], str]]:
+    """Yield ``(section_path, chunk)`` for the page, or one section of it.
+
+    ``section_path`` holds the section titles below the page, so text before
+    the first heading has an empty path.
+    """
+    count = count or _default_counter
+    if section_filter:
+        found = find_section(tree, section_filter)
+        if found is None:
+            return
+        stack = [found]
+    else:
+        stack = [((), tree)]
+
+    while stack:
+        path, node = stack.pop()
+        buffer: List[str] = []
+        buffer_tokens = 0
+        for line in node["text"].split("\n"):
+            paragraph = line.strip()
+            if len(paragraph) <= MIN_PARAGRAPH_LENGTH:
+                continue
+            for piece, piece_tokens in _split(paragraph, count, max_tokens):
+                if buffer and (
+                    buffer_tokens >= min_tokens
+                    or buffer_tokens + piece_tokens > max_tokens
+                ):
+                    yield path, "\n\n".join(buffer)
+                    buffer, buffer_tokens = [], 0
+                buffer.append(piece)
+                buffer_tokens += piece_tokens
+        if buffer:
+            yield path, "\n\n".join(buffer)
+        stack.extend(
+            (path + (section["title"],), section)
+            for section in reversed(node["sections"])
+        )
+
+
+def section_label(path: Tuple[str, ...]) -> str:
+    return " > ".join(path)
@@ -0,0 +1,64 @@
+"""Offline k-means clustering of a category's stored embeddings.
+
+The vectors are streamed out of the storage with ``iter_paragraph_records``,
+so no text is re-encoded. ``faiss.Kmeans`` groups them into topics, and the
+storage persists the centroids, the cluster of every paragraph and the
+paragraph closest to each centroid, which previews the cluster. The storages
+use the result to page through a category cluster by cluster. FAISS also uses
+it as the coarse quantizer of an IVF index once a category is large, and for
+diverse quiz sampling.
+
+Paragraphs appended later belong to no cluster (-1) until the category is
+clustered again. Nothing re-clusters on its own. Once more than
+``CLUSTER_STALE_FRACTION`` of the live paragraphs are unassigned, an append
+drops the clusters, and the category falls back to flat paging and sampling.
+A FAISS IVF base is then rebuilt as a flat index by the next compaction.
+"""
+
+import math
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+MAX_CLUSTERS = 64
+
+
+def default_clusters(paragraphs: int) -> int:
+    return max(1, min(MAX_CLUSTERS, int(math.sqrt(paragraphs / 2))))
+
+
+def cluster_category(
+    storage,
+    user_id: str,
+    category: str,
+    n_clusters: Optional[int] = None,
+    niter: int = 20,
+    seed: int = 1,
+) -> Optional[Dict]:
+    """Cluster a category and persist the result, ``None`` if it is empty."""
+    ids, vectors = [], []
+    for records in storage.iter_paragraph_records(user_id, category, 4096):
+        ids.extend(record["id"] for record in records)
+        vectors.extend(record["vector"] for record in records)
+    if not ids:
+        return None
+
+    vectors = np.ascontiguousarray(np.asarray(vectors, dtype="float32"))
+    n_clusters = min(n_clusters or default_clusters(len(ids)), len(ids))
+    kmeans = faiss.Kmeans(vectors.shape[1], n_clusters, niter=niter, seed=seed)
+    kmeans.train(vectors)
+    _, labels = kmeans.index.search(vectors, 1)
+
+    paragraphs = faiss.IndexFlatL2(vectors.shape[1])
+    paragraphs.add(vectors)
+    _, nearest = paragraphs.search(kmeans.centroids, 1)
+
+    storage.save_clusters(
+        user_id,
+        category,
+        kmeans.centroids,
+        dict(zip(ids, labels[:, 0].tolist())),
+        [ids[row] for row in nearest[:, 0]],
+    )
+    return {"clusters": n_clusters, "paragraphs": len(ids)}
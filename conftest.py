@@ -0,0 +1,6 @@
+# Present so pytest puts the repository root on sys.path, the app's modules
+# are imported flat (``import storage``) like the scripts in benchmarks/ do.
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "perf: timing budgets, sensitive to load")
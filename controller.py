@@ -1,26 +1,41 @@
 from embeddings import EmbeddingGenerator
-from faiss_storage import FaissStorage
+import profiling
 
-# from memgraph_storage import MemgraphStorage
+# Heavy dependencies (faiss, torch, openai, llama_index, wikipediaapi, pyarrow)
+# are imported where they are first used, so importing this module and
+# constructing the controllers stays fast.
 from dotenv import load_dotenv
-from openai import OpenAI
-from wikipedia_processor import WikipediaProcessor
-from wikipedia_detailed_processor import DetailedWikipediaProcessor
+import hashlib
 import os
 import json
 import re
-from typing import List
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional
 
 load_dotenv()
 
+# One storage per process, shared by both controllers so they use the same
+# index cache, locks and compactor
+_storage = None
+_storage_lock = threading.Lock()
+
 
 def get_ks_storage():
-    storage = os.getenv("KS_STORAGE", "").lower()
-    # if storage == "memgraph":
-    #     return MemgraphStorage()
-    if storage == "faiss":
-        return FaissStorage()
-    return FaissStorage()
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            storage = os.getenv("KS_STORAGE", "").lower()
+            # if storage == "memgraph":
+            #     from memgraph_storage import MemgraphStorage
+            #     _storage = MemgraphStorage()
+            from faiss_storage import FaissStorage
+
+            if storage == "faiss":
+                _storage = FaissStorage()
+            else:
+                _storage = FaissStorage()
+    return _storage
 
 
 def sanitize_category(category: str) -> str:
@@ -28,6 +43,14 @@ def sanitize_category(category: str) -> str:
     return re.sub(r"[^a-zA-Z0-9_]", "_", category)
 
 
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+def source_key(title: str, lang_prefix: str, section_filter: Optional[str]) -> str:
+    return f"{lang_prefix}:{title}:{section_filter or ''}"
+
+
 def extract_json(text: str) -> str:
     """Extract a JSON string from Markdown-style code blocks or plain output."""
     match = re.search(r"```json\s*(.*?)```", text, re.DOTALL)
@@ -37,11 +60,23 @@ def extract_json(text: str) -> str:
 
 
 class StorageController:
-    def __init__(self):
-        self._storage = get_ks_storage()
+    def __init__(self, storage=None):
+        self._storage = storage or get_ks_storage()
         self._embedding_generator = EmbeddingGenerator()
-        self._wikipedia_processor = WikipediaProcessor()
-        self._wikipedi_detailed_processor = DetailedWikipediaProcessor()
+        self._embedding_generator.warm_up()
+        self._processors = {}
+
+    def _get_processor(self, method: str):
+        if method not in self._processors:
+            if method == "quick":
+                from wikipedia_processor import WikipediaProcessor
+
+                self._processors[method] = WikipediaProcessor()
+            else:
+                from wikipedia_detailed_processor import DetailedWikipediaProcessor
+
+                self._processors[method] = DetailedWikipediaProcessor()
+        return self._processors[method]
 
     def initialize_user(self, user_id: str):
         self._storage.initialize_user(user_id)
@@ -58,6 +93,7 @@ class StorageController:
         mode="replace",
         method="quick",
         section_filter=None,
+        offline=False,
     ):
         if len(category) == 0:
             return 0
@@ -67,36 +103,189 @@ class StorageController:
             save_as_category = category
         save_as_category = sanitize_category(save_as_category)
 
+        processor = self._get_processor(method)
         if method == "quick":
-            paragraphs, embeddings = (
-                self._wikipedia_processor.process_wikipedia_documents(
-                    category, lang_prefix
-                )
+            paragraphs, embeddings, sections = processor.process_wikipedia_documents(
+                category, lang_prefix
             )
         else:
-            # Else detailed
-            paragraphs, embeddings = (
-                self._wikipedi_detailed_processor.process_detailed_sections(
-                    category, lang_prefix, section_filter
-                )
+            # Else detailed, served from the page cache when it is up to date
+            paragraphs, embeddings, sections = processor.process_detailed_sections(
+                category, lang_prefix, section_filter, offline=offline
             )
 
         if len(paragraphs) == 0:
             return 0
 
-        return self._storage.ingest_paragraphs(
-            user_id, save_as_category, paragraphs, embeddings, lang_prefix, mode
+        ids = [str(uuid.uuid4()) for _ in paragraphs]
+        count = self._storage.ingest_paragraphs(
+            user_id,
+            save_as_category,
+            paragraphs,
+            embeddings,
+            lang_prefix,
+            mode,
+            ids=ids,
+            sections=sections,
         )
+        # Remember which paragraphs came from the page, so sync_wikipedia can
+        # refresh them later without touching anything else in the category
+        key = source_key(category, lang_prefix, section_filter)
+        state = self._storage.get_sync_state(user_id, save_as_category)
+        if mode == "replace" or state is None:
+            state = {"sources": {}}
+        previous_ids = state["sources"].get(key, {}).get("ids", [])
+        state["sources"][key] = {
+            "title": category,
+            "lang_prefix": lang_prefix,
+            "section_filter": section_filter,
+            "revid": None,
+            "ids": previous_ids + ids,
+        }
+        self._storage.set_sync_state(user_id, save_as_category, state)
+        return count
+
+    def sync_wikipedia(
+        self,
+        user_id,
+        category,
+        save_as_category,
+        lang_prefix,
+        section_filter=None,
+        offline=False,
+    ) -> Optional[Dict]:
+        """Bring a category up to date with the page's latest revision.
+
+        The fresh chunks are matched against the stored paragraphs by content
+        hash. Only new chunks are embedded and appended, and only chunks gone
+        from the page are deleted. Nothing is done while the revision is the
+        one synced last. In a category ingested before syncing existed, stored
+        paragraphs matching the page are adopted as its own, nothing is deleted.
+        """
+        if len(category) == 0:
+            return None
+        category = sanitize_category(category)
+        if len(save_as_category) == 0:
+            save_as_category = category
+        save_as_category = sanitize_category(save_as_category)
+
+        revid, chunks = self._get_processor("detailed").chunk_page(
+            category, lang_prefix, section_filter, offline=offline
+        )
+        if revid is None:
+            return None
+
+        key = source_key(category, lang_prefix, section_filter)
+        state = self._storage.get_sync_state(user_id, save_as_category)
+        legacy = state is None
+        state = state or {"sources": {}}
+        source = state["sources"].get(key)
+        if source is not None and source["revid"] == revid:
+            unchanged = len(source["ids"])
+            return {"revid": revid, "added": 0, "removed": 0, "unchanged": unchanged}
+
+        stored = {
+            paragraph["id"]: paragraph["content"]
+            for paragraph in self._storage.get_all_paragraphs(user_id, save_as_category)
+        }
+        if source is not None:
+            owned = [i for i in source["ids"] if i in stored]
+        else:
+            # A new page never claims paragraphs of other pages, custom text or
+            # imports. Paragraphs of a category ingested before syncing existed
+            # are matched so they are not added twice, but never deleted.
+            owned = stored if legacy else []
+        by_hash = {}
+        for paragraph_id in owned:
+            by_hash.setdefault(content_hash(stored[paragraph_id]), []).append(
+                paragraph_id
+            )
+
+        kept, added = [], []
+        for position, (_, chunk) in enumerate(chunks):
+            matches = by_hash.get(content_hash(chunk))
+            if matches:
+                kept.append(matches.pop())
+            else:
+                added.append(position)
+        removed = []
+        if source is not None:
+            removed = [paragraph_id for ids in by_hash.values() for paragraph_id in ids]
+
+        if removed:
+            self._storage.delete_paragraphs(user_id, save_as_category, removed)
+
+        added_ids = [str(uuid.uuid4()) for _ in added]
+        if added:
+            texts = [chunks[position][1] for position in added]
+            embeddings = self._embedding_generator.get_embeddings(texts)
+            # Chunks that follow each other on the page go in as one run
+            start = 0
+            for end in range(1, len(added) + 1):
+                if end < len(added) and added[end] == added[end - 1] + 1:
+                    continue
+                self._storage.ingest_paragraphs(
+                    user_id,
+                    save_as_category,
+                    texts[start:end],
+                    embeddings[start:end],
+                    lang_prefix,
+                    "append",
+                    ids=added_ids[start:end],
+                    sections=[chunks[p][0] for p in added[start:end]],
+                )
+                start = end
+
+        state["sources"][key] = {
+            "title": category,
+            "lang_prefix": lang_prefix,
+            "section_filter": section_filter,
+            "revid": revid,
+            "ids": kept + added_ids,
+        }
+        self._storage.set_sync_state(user_id, save_as_category, state)
+        return {
+            "revid": revid,
+            "added": len(added),
+            "removed": len(removed),
+            "unchanged": len(kept),
+        }
+
+    def sync_all_wikipedia(self, user_id: str, offline=False) -> Dict[str, List]:
+        """Sync every Wikipedia source of every category, e.g. from a cron job."""
+        results = {}
+        for category in self._storage.get_all_categories(user_id):
+            state = self._storage.get_sync_state(user_id, category)
+            for source in (state or {"sources": {}})["sources"].values():
+                results.setdefault(category, []).append(
+                    self.sync_wikipedia(
+                        user_id,
+                        source["title"],
+                        category,
+                        source["lang_prefix"],
+                        source["section_filter"],
+                        offline=offline,
+                    )
+                )
+        return results
 
     def get_similar_documents(
-        self, user_id: str, category: str, question: str, n: int
+        self, user_id: str, category: str, question: str, n: int, window: int = 0
     ) -> List[str]:
         category = sanitize_category(category)
-        query_vector = self._embedding_generator.get_question_embedding(question)
-
-        results = self._storage.get_similar_documents(
-            user_id, category, query_vector, n
-        )
+        profiling.describe(lambda: self._storage.describe_category(user_id, category))
+        with profiling.stage("embedding"):
+            query_vector = self._embedding_generator.get_question_embedding(question)
+
+        with profiling.stage("storage"):
+            if window > 0:
+                results = self._storage.get_similar_documents_with_context(
+                    user_id, category, query_vector, n, window
+                )
+            else:
+                results = self._storage.get_similar_documents(
+                    user_id, category, query_vector, n
+                )
 
         context = [result["content"] for result in results]
         return context
@@ -118,23 +307,107 @@ class StorageController:
             p.strip() for p in cleaned_text.split("\n\n") if len(p.strip()) > 0
         ]
         embeddings = self._embedding_generator.get_embeddings(paragraphs)
-        return self._storage.ingest_paragraphs(
+        count = self._storage.ingest_paragraphs(
             user_id, category, paragraphs, embeddings, lang_prefix, mode
         )
+        self._track_sync_state(user_id, category, mode)
+        return count
+
+    def _track_sync_state(self, user_id: str, category: str, mode: str):
+        # Categories holding paragraphs from anywhere but a page get an empty
+        # sync state, so a later sync never takes them for a legacy page ingest
+        state = self._storage.get_sync_state(user_id, category)
+        if mode == "replace" or state is None:
+            self._storage.set_sync_state(user_id, category, {"sources": {}})
 
     def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
         category = sanitize_category(category)
         return self._storage.delete_paragraph(user_id, category, paragraph_id)
 
+    def cluster_category(
+        self, user_id: str, category: str, n_clusters: Optional[int] = None
+    ) -> Optional[Dict]:
+        import clustering
+
+        category = sanitize_category(category)
+        return clustering.cluster_category(
+            self._storage, user_id, category, n_clusters=n_clusters
+        )
+
+    def get_clusters(self, user_id: str, category: str):
+        category = sanitize_category(category)
+        return self._storage.get_clusters(user_id, category)
+
+    def get_cluster_paragraphs(
+        self, user_id: str, category: str, cluster: int, page=0, page_size=20
+    ):
+        category = sanitize_category(category)
+        return self._storage.get_cluster_paragraphs(
+            user_id, category, cluster, page * page_size, page_size
+        )
+
+    def get_slow_queries(self, admin_token: str, limit: int = 50) -> List[Dict]:
+        # The log holds every user's questions and categories
+        if not profiling.is_admin(admin_token):
+            raise PermissionError("Invalid admin token")
+        return profiling.read_slow_queries(limit)
+
+    def export_categories(self, user_id: str, categories: List[str], sink) -> int:
+        import bulk_io
+
+        categories = [sanitize_category(category) for category in categories]
+        return bulk_io.export_categories(self._storage, user_id, categories, sink)
+
+    def iter_export(self, user_id: str, categories: List[str]) -> Iterator[bytes]:
+        import bulk_io
+
+        categories = [sanitize_category(category) for category in categories]
+        return bulk_io.iter_export(self._storage, user_id, categories)
+
+    def import_paragraphs(
+        self, user_id: str, source, mode="replace", category: Optional[str] = None
+    ):
+        import bulk_io
+
+        imported = bulk_io.import_paragraphs(
+            self._storage,
+            user_id,
+            source,
+            mode=mode,
+            category=category or None,
+            sanitize=sanitize_category,
+        )
+        for imported_category in imported:
+            self._track_sync_state(user_id, imported_category, mode)
+        return imported
+
 
 class LLMController:
-    def __init__(self):
-        self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self._storage = get_ks_storage()
+    def __init__(self, storage=None):
+        self._openai_client = None
+        self._storage = storage or get_ks_storage()
+
+    @property
+    def _client(self):
+        if self._openai_client is None:
+            from openai import OpenAI
+
+            self._openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
 
     def answer_question_based_on_excerpts(
-        self, user_id: str, question: str, context: List[str], lang_prefix: str
+        self,
+        user_id: str,
+        question: str,
+        context: List[str],
+        lang_prefix: str,
+        category: Optional[str] = None,
     ) -> str:
+        if category:
+            category = sanitize_category(category)
+            profiling.describe(
+                lambda: self._storage.describe_category(user_id, category)
+            )
         context_text = "\n\n".join(context)
 
         prompt = f"""
@@ -157,11 +430,12 @@ class LLMController:
     Answer:
     """
 
-        response = self._client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-        )
+        with profiling.stage("llm"):
+            response = self._client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.0,
+            )
         answer = response.choices[0].message.content
 
         return answer
@@ -173,10 +447,12 @@ class LLMController:
         number_of_questions: int,
         lang_prefix: str,
         better_explanation: str,
+        diverse: bool = False,
+        seed: Optional[int] = None,
     ):
         category = sanitize_category(category)
         results = self._storage.sample_n_connected_paragraphs(
-            user_id, category, number_of_questions
+            user_id, category, number_of_questions, seed=seed, diverse=diverse
         )
         if not results:
             return None
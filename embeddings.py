@@ -1,21 +1,48 @@
-from sentence_transformers import SentenceTransformer
+import threading
 from typing import List
 
+from profiling import stage
+
 # model_name = "all-mpnet-base-v2"
 model_name = "all-MiniLM-L6-v2"
+
+# One model per process, shared by every EmbeddingGenerator
+_model = None
+_model_lock = threading.Lock()
+
+
+def _load_model():
+    global _model
+    if _model is not None:
+        return _model
+    # Counts the wait for a warm-up still loading in the background, too
+    with stage("model_load"), _model_lock:
+        if _model is None:
+            # Importing sentence_transformers pulls in torch, so it waits until
+            # the model is actually needed
+            from sentence_transformers import SentenceTransformer
+
+            # _model = SentenceTransformer(model_name, device="cpu")
+            try:
+                _model = SentenceTransformer("local_model/", device="cpu")
+            except NotImplementedError:
+                _model = SentenceTransformer("local_model/")
+    return _model
+
+
 class EmbeddingGenerator:
-    def __init__(self):
-        # self._model = SentenceTransformer(model_name, device="cpu")
-        # self._model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
-        try:
-            self._model = SentenceTransformer("local_model/", device="cpu")
-        except NotImplementedError:
-            self._model = SentenceTransformer("local_model/")
-    
+    def warm_up(self) -> threading.Thread:
+        """Load the model in a background thread so the first query is fast."""
+        thread = threading.Thread(
+            target=_load_model, name="embedding-warm-up", daemon=True
+        )
+        thread.start()
+        return thread
+
     def get_embeddings(self, paragraphs: List[str]):
-        embeddings = self._model.encode(paragraphs, convert_to_numpy=True)
+        embeddings = _load_model().encode(paragraphs, convert_to_numpy=True)
         return embeddings
 
     def get_question_embedding(self, query: str):
-        query_vector = self._model.encode(query).tolist()
+        query_vector = _load_model().encode(query).tolist()
         return query_vector
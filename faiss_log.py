@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def encode_add(entry: Dict, vector) -> Dict:
+    vector = np.asarray(vector, dtype="float32")
+    return {
+        "op": "add",
+        "entry": entry,
+        "vector": base64.b64encode(vector.tobytes()).decode("ascii"),
+    }
+
+
+def encode_delete(paragraph_id: str) -> Dict:
+    return {"op": "delete", "id": paragraph_id}
+
+
+def append_records(path: str, records: List[Dict]):
+    # One write call per batch and a trailing newline per record, readers skip
+    # a final line without newline as it belongs to an append still in flight.
+    data = "".join(json.dumps(record) + "\n" for record in records)
+    with open(path, "a") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_log(path: str) -> Tuple[Optional[np.ndarray], List[Dict], set]:
+    """Replay the append log into delta vectors, their metadata and tombstones."""
+    vectors, metadata, deleted = [], [], set()
+    try:
+        with open(path, "r") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None, metadata, deleted
+
+    for line in raw.split("\n")[:-1]:
+        record = json.loads(line)
+        if record["op"] == "add":
+            vectors.append(
+                np.frombuffer(base64.b64decode(record["vector"]), dtype="float32")
+            )
+            metadata.append(record["entry"])
+        elif record["op"] == "delete":
+            deleted.add(record["id"])
+
+    if not vectors:
+        return None, metadata, deleted
+    return np.vstack(vectors), metadata, deleted
+
+
+class Compactor:
+    """Background thread folding append logs into their base index.
+
+    A category is compacted once its log grows past ``max_log_bytes``, or once
+    ``max_delay_seconds`` have passed since its first uncompacted write.
+    """
+
+    def __init__(
+        self,
+        compact: Callable[[str, str], None],
+        max_log_bytes: int = 1024 * 1024,
+        max_delay_seconds: float = 300.0,
+        poll_seconds: float = 5.0,
+    ):
+        self._compact = compact
+        self.max_log_bytes = max_log_bytes
+        self.max_delay_seconds = max_delay_seconds
+        self.poll_seconds = poll_seconds
+        self._pending: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def notify(
+        self,
+        user_id: str,
+        category: str,
+        log_bytes: int,
+        since: Optional[float] = None,
+    ):
+        with self._lock:
+            pending = self._pending.setdefault(
+                (user_id, category), {"since": since or time.time()}
+            )
+            pending["log_bytes"] = log_bytes
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="faiss-compactor", daemon=True
+                )
+                self._thread.start()
+        if log_bytes >= self.max_log_bytes:
+            self._wake.set()
+
+    def _due(self) -> List[Tuple[str, str]]:
+        now = time.time()
+        with self._lock:
+            due = [
+                key
+                for key, pending in self._pending.items()
+                if pending["log_bytes"] >= self.max_log_bytes
+                or now - pending["since"] >= self.max_delay_seconds
+            ]
+            for key in due:
+                del self._pending[key]
+        return due
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            for user_id, category in self._due():
+                try:
+                    self._compact(user_id, category)
+                except Exception as e:
+                    print(f"❌ Compaction of '{category}' failed: {e}")
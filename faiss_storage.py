@@ -3,10 +3,27 @@ import os
 import uuid
 import json
 import numpy as np
-from typing import List
-from storage import Storage
-from sentence_transformers import SentenceTransformer
-import random
+from typing import List, Optional
+from storage import (
+    CLUSTER_STALE_FRACTION,
+    CategoryStats,
+    ClusterSummary,
+    Paragraph,
+    Storage,
+    merge_windows,
+)
+from faiss_tenants import TenantIndexManager
+from faiss_log import Compactor, append_records, encode_add, encode_delete, read_log
+from locking import (
+    FileLocks,
+    atomic_path,
+    atomic_write_json,
+    generation_commit,
+    read_consistent,
+)
+
+# Clusters diverse quiz sampling spreads its windows over
+SAMPLING_CLUSTERS = 16
 
 
 class FaissStorage(Storage):
@@ -14,12 +31,37 @@ class FaissStorage(Storage):
         super().__init__()
         self.index_dir = index_dir
         os.makedirs(index_dir, exist_ok=True)
-        # self._model = SentenceTransformer("all-mpnet-base-v2", device="cpu")
-        # self._model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
-        try:
-            self._model = SentenceTransformer("local_model/", device="cpu")
-        except NotImplementedError:
-            self._model = SentenceTransformer("local_model/")
+        memory_budget_mb = int(os.getenv("KS_FAISS_MEMORY_BUDGET_MB", "512"))
+        pack_threshold_kb = int(os.getenv("KS_FAISS_PACK_THRESHOLD_KB", "64"))
+        self._tenants = TenantIndexManager(
+            index_dir,
+            memory_budget_bytes=memory_budget_mb * 1024 * 1024,
+            pack_threshold_bytes=pack_threshold_kb * 1024,
+            nprobe=int(os.getenv("KS_FAISS_NPROBE", "8")),
+        )
+        # Clustered categories this large are stored as IVF over their centroids
+        self._ivf_min_rows = int(os.getenv("KS_FAISS_IVF_MIN_ROWS", "20000"))
+        self._locks = FileLocks()
+        self._compactor = Compactor(
+            self.compact,
+            max_log_bytes=int(os.getenv("KS_FAISS_COMPACT_KB", "1024")) * 1024,
+            max_delay_seconds=float(os.getenv("KS_FAISS_COMPACT_SECONDS", "300")),
+        )
+        self._enqueue_existing_logs()
+
+    def _enqueue_existing_logs(self):
+        # Pending compactions only live in memory, logs left by an earlier
+        # process are picked up again, aged from their last write
+        for user in os.scandir(self.index_dir):
+            if not user.is_dir():
+                continue
+            for entry in os.scandir(user.path):
+                if entry.name.endswith(".log"):
+                    category = entry.name[: -len(".log")]
+                    stat = entry.stat()
+                    self._compactor.notify(
+                        user.name, category, stat.st_size, since=stat.st_mtime
+                    )
 
     def _get_user_dir(self, user_id: str):
         return f"{self.index_dir}/{user_id}"
@@ -30,15 +72,161 @@ class FaissStorage(Storage):
     def _get_metadata_path(self, user_id: str, category: str):
         return os.path.join(self._get_user_dir(user_id), f"{category}.json")
 
+    def _get_lock_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.lock")
+
+    def _get_generation_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.gen")
+
+    def _get_clusters_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.clusters.json")
+
+    def _get_sync_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.sync.json")
+
+    def _get_log_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.log")
+
+    def _get_commit_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.commit")
+
+    def _generation_commit(self, user_id: str, category: str):
+        return generation_commit(
+            self._get_generation_path(user_id, category),
+            repair=lambda: self._repair(user_id, category),
+        )
+
+    def _commit(self, user_id: str, category: str, index, metadata: List[dict]):
+        # Callers hold the category's exclusive lock. The new files are staged
+        # next to the current ones, then a commit marker is written and they
+        # are swapped in, so an interrupted commit can be rolled either way.
+        # The new base holds the full category, so the append log is dropped.
+        index_path = self._get_index_path(user_id, category)
+        metadata_path = self._get_metadata_path(user_id, category)
+        with self._generation_commit(user_id, category):
+            if index is not None:
+                with atomic_path(f"{index_path}.next") as temp_path:
+                    faiss.write_index(index, temp_path)
+            atomic_write_json(f"{metadata_path}.next", metadata)
+            atomic_write_json(
+                self._get_commit_path(user_id, category), {"index": index is not None}
+            )
+            self._finish_commit(user_id, category)
+        self._tenants.invalidate(user_id, category)
+
+    def _finish_commit(self, user_id: str, category: str):
+        # Safe to run again after a crash part way through
+        index_path = self._get_index_path(user_id, category)
+        metadata_path = self._get_metadata_path(user_id, category)
+        log_path = self._get_log_path(user_id, category)
+        commit_path = self._get_commit_path(user_id, category)
+        with open(commit_path, "r") as f:
+            staged = json.load(f)
+        if not staged["index"]:
+            if os.path.exists(index_path):
+                os.remove(index_path)
+        elif os.path.exists(f"{index_path}.next"):
+            os.replace(f"{index_path}.next", index_path)
+        if os.path.exists(f"{metadata_path}.next"):
+            os.replace(f"{metadata_path}.next", metadata_path)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        os.remove(commit_path)
+
+    def _repair(self, user_id: str, category: str):
+        """Restore a category whose last commit failed or was interrupted."""
+        # Callers hold the category's exclusive lock
+        if os.path.exists(self._get_commit_path(user_id, category)):
+            # Everything was staged, so the commit is completed
+            self._finish_commit(user_id, category)
+        else:
+            for path in (
+                self._get_index_path(user_id, category),
+                self._get_metadata_path(user_id, category),
+            ):
+                if os.path.exists(f"{path}.next"):
+                    os.remove(f"{path}.next")
+
+        # An append cut short leaves a last line without newline, which the
+        # next append would glue onto its first record
+        log_path = self._get_log_path(user_id, category)
+        if os.path.exists(log_path):
+            with open(log_path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        print(f"⚠️ Repaired category '{category}' after an interrupted commit")
+        self._tenants.invalidate(user_id, category)
+
+    def _append(self, user_id: str, category: str, records: List[dict]):
+        # Callers hold the category's exclusive lock
+        log_path = self._get_log_path(user_id, category)
+        with self._generation_commit(user_id, category):
+            append_records(log_path, records)
+        self._tenants.invalidate(user_id, category)
+        self._compactor.notify(user_id, category, os.path.getsize(log_path))
+
+    def _read_state(self, user_id: str, category: str):
+        # Callers hold the category's lock or retry through read_consistent
+        index = faiss.read_index(self._get_index_path(user_id, category))
+        with open(self._get_metadata_path(user_id, category), "r") as f:
+            metadata = json.load(f)
+        delta_vectors, delta, deleted = read_log(self._get_log_path(user_id, category))
+        return index, metadata, delta_vectors, delta, deleted
+
+    def _read_clusters(self, user_id: str, category: str):
+        try:
+            with open(self._get_clusters_path(user_id, category)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _build_index(self, user_id: str, category: str, vectors: np.ndarray):
+        clusters = self._read_clusters(user_id, category)
+        if clusters is None or len(vectors) < self._ivf_min_rows:
+            index = faiss.IndexFlatL2(vectors.shape[1])
+            index.add(vectors)
+            return index
+
+        # The stored centroids are the coarse quantizer, so no training pass
+        centroids = np.asarray(clusters["centroids"], dtype="float32")
+        quantizer = faiss.IndexFlatL2(vectors.shape[1])
+        quantizer.add(centroids)
+        index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], len(centroids))
+        index.add(vectors)
+        # Exports and compaction read vectors back by row
+        index.make_direct_map()
+        return index
+
+    def compact(self, user_id: str, category: str, force: bool = False):
+        """Fold the append log of a category into its base index."""
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            log_exists = os.path.exists(self._get_log_path(user_id, category))
+            if not log_exists and not force:
+                return
+            index, metadata, delta_vectors, delta, deleted = self._read_state(
+                user_id, category
+            )
+
+            vectors = index.reconstruct_n(0, index.ntotal)
+            if delta_vectors is not None:
+                vectors = np.vstack([vectors, delta_vectors])
+            metadata = metadata + delta
+            keep = [i for i, entry in enumerate(metadata) if entry["id"] not in deleted]
+
+            compacted = None
+            if keep:
+                compacted = self._build_index(user_id, category, vectors[keep])
+            self._commit(user_id, category, compacted, [metadata[i] for i in keep])
+
     def initialize_user(self, user_id: str):
         os.makedirs(f"{self.index_dir}/{user_id}", exist_ok=True)
 
     def get_all_categories(self, user_id: str):
-        return [
-            f.replace(".index", "")
-            for f in os.listdir(self._get_user_dir(user_id))
-            if f.endswith(".index")
-        ]
+        return self._tenants.list_categories(user_id)
+
+    def get_category_catalog(self, user_id: str):
+        return self._tenants.get_catalog(user_id)
 
     def ingest_paragraphs(
         self,
@@ -48,94 +236,204 @@ class FaissStorage(Storage):
         embeddings: List,
         lang_prefix: str,
         mode: str,
+        ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None,
     ):
         index_path = self._get_index_path(user_id, category)
-        metadata_path = self._get_metadata_path(user_id, category)
-
-        dim = len(embeddings[0])
-        index = faiss.IndexFlatL2(dim)
-
-        if os.path.exists(index_path) and mode == "append":
-            index = faiss.read_index(index_path)
-            with open(metadata_path, "r") as f:
-                existing_metadata = json.load(f)
-        else:
-            existing_metadata = []
+        self.initialize_user(user_id)
 
         vectors = np.array(embeddings).astype("float32")
-        index.add(vectors)
-
-        for idx, content in enumerate(paragraphs):
-            existing_metadata.append(
-                {
-                    "id": str(uuid.uuid4()),
-                    "content": content.strip(),
-                    "page": category,
-                    "index": idx,
-                    "lang_prefix": lang_prefix,
-                }
-            )
+        new_metadata = [
+            {
+                "id": ids[idx] if ids else str(uuid.uuid4()),
+                "content": content.strip(),
+                "page": category,
+                "index": idx,
+                "lang_prefix": lang_prefix,
+                "section": sections[idx] if sections else None,
+            }
+            for idx, content in enumerate(paragraphs)
+        ]
 
-        faiss.write_index(index, index_path)
-        with open(metadata_path, "w") as f:
-            json.dump(existing_metadata, f)
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            if mode == "append" and os.path.exists(index_path):
+                # Appends only touch the log, the compactor folds it in later
+                self._append(
+                    user_id,
+                    category,
+                    [
+                        encode_add(entry, vector)
+                        for entry, vector in zip(new_metadata, vectors)
+                    ],
+                )
+                self._drop_stale_clusters(user_id, category)
+            else:
+                # Clusters and sync sources belong to the replaced paragraphs
+                for path in (
+                    self._get_clusters_path(user_id, category),
+                    self._get_sync_path(user_id, category),
+                ):
+                    if os.path.exists(path):
+                        os.remove(path)
+                index = self._build_index(user_id, category, vectors)
+                self._commit(user_id, category, index, new_metadata)
 
         return len(paragraphs)
 
     def get_similar_documents(
         self, user_id: str, category: str, query_vector: List[float], n: int
     ):
-        index_path = self._get_index_path(user_id, category)
-        metadata_path = self._get_metadata_path(user_id, category)
-
-        if not os.path.exists(index_path):
+        view = self._tenants.get(user_id, category)
+        if view is None:
             return []
 
-        index = faiss.read_index(index_path)
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
-
-        query_vector = np.array(query_vector).astype("float32").reshape(1, -1)
-        distances, indices = index.search(query_vector, n)
+        metadata = view.metadata
+        distances, indices = view.search(query_vector, n)
 
         results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(metadata):
+        for idx, dist in zip(indices, distances):
+            if 0 <= idx < len(metadata):
                 results.append(
                     {"content": metadata[idx]["content"], "similarity": 1 - float(dist)}
                 )
 
         return results
 
+    def get_similar_documents_with_context(
+        self,
+        user_id: str,
+        category: str,
+        query_vector: List[float],
+        n: int,
+        window: int,
+    ):
+        view = self._tenants.get(user_id, category)
+        if view is None:
+            return []
+
+        metadata = view.metadata
+        distances, indices = view.search(query_vector, n)
+
+        windows = []
+        for idx, dist in zip(indices, distances):
+            if idx < 0 or idx >= len(metadata):
+                continue
+            # Neighbours are only followed within the same ingest batch, the same
+            # way :NEXT edges are only created between paragraphs of one batch.
+            # Deleted rows are stepped over, like the bridged :NEXT chain.
+            start, found = idx, 0
+            while start > 0 and found < window and metadata[start]["index"] != 0:
+                start -= 1
+                found += metadata[start]["id"] not in view.deleted
+            end, found = idx, 0
+            while (
+                end + 1 < len(metadata)
+                and found < window
+                and metadata[end + 1]["index"] != 0
+            ):
+                end += 1
+                found += metadata[end]["id"] not in view.deleted
+            windows.append(
+                {
+                    "similarity": 1 - float(dist),
+                    "paragraphs": [
+                        (metadata[i]["id"], i, metadata[i]["content"])
+                        for i in range(start, end + 1)
+                        if metadata[i]["id"] not in view.deleted
+                    ],
+                }
+            )
+
+        return merge_windows(windows)
+
     def get_paragraph_ids(self, user_id: str, category: str) -> List[str]:
-        metadata_path = self._get_metadata_path(user_id, category)
-        if not os.path.exists(metadata_path):
+        view = self._tenants.get(user_id, category)
+        if view is None:
             return []
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
-        return [entry["id"] for entry in metadata]
+        return [entry["id"] for entry in view.live_metadata()]
 
     def sample_n_connected_paragraphs(
-        self, user_id: str, category: str, number_of_questions: int
+        self,
+        user_id: str,
+        category: str,
+        number_of_questions: int,
+        seed: Optional[int] = None,
+        diverse: bool = False,
     ):
-        metadata_path = self._get_metadata_path(user_id, category)
-        if not os.path.exists(metadata_path):
+        view = self._tenants.get(user_id, category)
+        if view is None:
             return None
 
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
-
-        sample_size = min(len(metadata), number_of_questions)
-        sampled = random.sample(metadata, sample_size)
-        return [{"content": entry["content"]} for entry in sampled]
+        assignments = None
+        if diverse:
+            clusters = self._read_clusters(user_id, category)
+            assignments = clusters["assignments"] if clusters else None
+        sampling = view.sampling_index(
+            SAMPLING_CLUSTERS if diverse else 0, assignments=assignments
+        )
+        rows = sampling.sample_offsets(
+            number_of_questions, seed=seed, diverse=diverse
+        )
+        if not rows:
+            return None
+        return [{"content": view.metadata[row]["content"]} for row in rows]
 
-    def get_all_paragraphs(self, user_id: str, category: str) -> list[str]:
-        metadata_path = self._get_metadata_path(user_id, category)
-        if not os.path.exists(metadata_path):
+    def get_all_paragraphs(self, user_id: str, category: str) -> List[Paragraph]:
+        view = self._tenants.get(user_id, category)
+        if view is None:
             return []
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
-        return [{"content": entry["content"], "id": entry["id"]} for entry in metadata]
+        return [
+            {"content": entry["content"], "id": entry["id"]}
+            for entry in view.live_metadata()
+        ]
+
+    def iter_paragraph_records(
+        self, user_id: str, category: str, batch_size: int = 1024
+    ):
+        def load():
+            try:
+                return self._read_state(user_id, category)
+            except (FileNotFoundError, RuntimeError):
+                # faiss raises RuntimeError for a missing file
+                return None
+
+        # Like the index cache, the snapshot never waits behind a commit
+        _, state = read_consistent(self._get_generation_path(user_id, category), load)
+        if state is None:
+            return
+        index, metadata, delta_vectors, delta, deleted = state
+
+        entries = metadata + delta
+        starts_run = True
+        for start in range(0, len(entries), batch_size):
+            end = min(start + batch_size, len(entries))
+            base_end = min(end, index.ntotal)
+            parts = []
+            if start < base_end:
+                parts.append(index.reconstruct_n(start, base_end - start))
+            if end > index.ntotal:
+                delta_start = max(start, index.ntotal) - index.ntotal
+                parts.append(delta_vectors[delta_start : end - index.ntotal])
+            vectors = np.vstack(parts)
+
+            records = []
+            for entry, vector in zip(entries[start:end], vectors):
+                starts_run = starts_run or entry["index"] == 0
+                if entry["id"] in deleted:
+                    continue
+                run_start, starts_run = starts_run, False
+                records.append(
+                    {
+                        "id": entry["id"],
+                        "content": entry["content"],
+                        "position": entry["index"],
+                        "run_start": run_start,
+                        "lang_prefix": entry["lang_prefix"],
+                        "section": entry.get("section"),
+                        "vector": vector,
+                    }
+                )
+            yield records
 
     def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
         index_path = self._get_index_path(user_id, category)
@@ -145,32 +443,133 @@ class FaissStorage(Storage):
             print(f"❌ No index or metadata found for category '{category}'")
             return
 
-        # Load metadata
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            _, metadata, _, delta, deleted = self._read_state(user_id, category)
+            ids = {entry["id"] for entry in metadata + delta} - deleted
+
+            if paragraph_id not in ids:
+                print(
+                    f"⚠️ Paragraph ID '{paragraph_id}' not found in '{category}'."
+                )
+                return
+
+            # A tombstone hides the paragraph until the compactor drops its row
+            self._append(user_id, category, [encode_delete(paragraph_id)])
+
+        print(f"✅ Paragraph '{paragraph_id}' deleted from '{category}'")
 
-        # Find and remove the target entry
-        updated_metadata = [entry for entry in metadata if entry["id"] != paragraph_id]
+    def delete_paragraphs(
+        self, user_id: str, category: str, paragraph_ids: List[str]
+    ) -> int:
+        if not os.path.exists(self._get_index_path(user_id, category)):
+            return 0
+
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            _, metadata, _, delta, deleted = self._read_state(user_id, category)
+            live = {entry["id"] for entry in metadata + delta} - deleted
+            doomed = [pid for pid in dict.fromkeys(paragraph_ids) if pid in live]
+            if doomed:
+                self._append(
+                    user_id, category, [encode_delete(pid) for pid in doomed]
+                )
+        return len(doomed)
 
-        if len(updated_metadata) == len(metadata):
-            print(f"⚠️ Paragraph ID '{paragraph_id}' not found in '{category}'.")
+    def save_clusters(
+        self,
+        user_id: str,
+        category: str,
+        centroids,
+        assignments: dict,
+        representatives: List[str],
+    ):
+        clusters = {
+            "centroids": np.asarray(centroids).tolist(),
+            "assignments": assignments,
+            "representatives": representatives,
+        }
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            # A new generation makes every process drop its cached sampling index
+            with self._generation_commit(user_id, category):
+                atomic_write_json(self._get_clusters_path(user_id, category), clusters)
+            self._tenants.invalidate(user_id, category)
+        if len(assignments) >= self._ivf_min_rows:
+            self.compact(user_id, category, force=True)
+
+    def _drop_stale_clusters(self, user_id: str, category: str):
+        # Callers hold the category's exclusive lock. Without clusters the next
+        # compaction rebuilds an IVF base as a flat index.
+        clusters = self._read_clusters(user_id, category)
+        if clusters is None:
+            return
+        live = self._tenants.get(user_id, category).live_metadata()
+        assignments = clusters["assignments"]
+        unassigned = sum(entry["id"] not in assignments for entry in live)
+        if unassigned <= CLUSTER_STALE_FRACTION * len(live):
             return
+        with self._generation_commit(user_id, category):
+            os.remove(self._get_clusters_path(user_id, category))
+        self._tenants.invalidate(user_id, category)
+        print(f"⚠️ Clusters of '{category}' are out of date and were dropped")
+
+    def _cluster_members(self, user_id: str, category: str):
+        view = self._tenants.get(user_id, category)
+        clusters = self._read_clusters(user_id, category)
+        if view is None or clusters is None:
+            return None, None
+        members = {}
+        for entry in view.live_metadata():
+            cluster = clusters["assignments"].get(entry["id"], -1)
+            members.setdefault(cluster, []).append(entry)
+        return clusters, members
+
+    def get_clusters(self, user_id: str, category: str) -> List[ClusterSummary]:
+        clusters, members = self._cluster_members(user_id, category)
+        if clusters is None:
+            return None
 
-        # Recompute embeddings for updated metadata
-        contents = [entry["content"] for entry in updated_metadata]
-        if contents:
-            embeddings = self._model.encode(contents, convert_to_numpy=True).astype(
-                "float32"
+        summaries = []
+        for cluster, entries in sorted(members.items()):
+            preview = entries[0]["content"]
+            if cluster >= 0:
+                representative = clusters["representatives"][cluster]
+                preview = next(
+                    (e["content"] for e in entries if e["id"] == representative),
+                    preview,
+                )
+            summaries.append(
+                {"cluster": cluster, "size": len(entries), "preview": preview}
             )
-            index = faiss.IndexFlatL2(embeddings.shape[1])
-            index.add(embeddings)
-            faiss.write_index(index, index_path)
-        else:
-            # If no content remains, remove index file
-            os.remove(index_path)
+        return summaries
 
-        # Write back updated metadata
-        with open(metadata_path, "w") as f:
-            json.dump(updated_metadata, f)
+    def get_cluster_paragraphs(
+        self, user_id: str, category: str, cluster: int, offset: int, limit: int
+    ) -> List[Paragraph]:
+        _, members = self._cluster_members(user_id, category)
+        entries = (members or {}).get(cluster, [])
+        return [
+            {"content": entry["content"], "id": entry["id"]}
+            for entry in entries[offset : offset + limit]
+        ]
 
-        print(f"✅ Paragraph '{paragraph_id}' deleted from '{category}'")
+    def describe_category(
+        self, user_id: str, category: str
+    ) -> Optional[CategoryStats]:
+        view = self._tenants.get(user_id, category)
+        if view is None:
+            return None
+        index_type = type(view.index).__name__
+        if view.category_id is not None:
+            index_type += " (shared)"
+        return {"paragraphs": len(view.live_metadata()), "index_type": index_type}
+
+    def get_sync_state(self, user_id: str, category: str):
+        try:
+            with open(self._get_sync_path(user_id, category)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set_sync_state(self, user_id: str, category: str, state: dict):
+        self.initialize_user(user_id)
+        with self._locks.exclusive(self._get_lock_path(user_id, category)):
+            atomic_write_json(self._get_sync_path(user_id, category), state)
@@ -0,0 +1,391 @@
+import faiss
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from faiss_log import read_log
+from locking import read_consistent, read_generation
+from profiling import stage
+from sampling import SamplingIndex
+
+# Categories are packed as contiguous id ranges of a per-user IndexIDMap2,
+# the upper bits of the id hold the category id and the lower bits the row.
+CATEGORY_ID_SHIFT = 32
+SHARED_KEY = "__shared__"
+# k-means wants roughly this many points per cluster to train well
+MIN_POINTS_PER_CLUSTER = 39
+
+
+class _CategoryData:
+    """One category's base index plus the not yet compacted append log."""
+
+    def __init__(self, index, metadata, metadata_size, delta_vectors, delta, deleted):
+        self.index = index
+        self.base_count = len(metadata)
+        self.metadata = metadata + delta
+        self.delta_vectors = delta_vectors
+        self.deleted = deleted
+        self.nbytes = index.ntotal * index.d * 4 + metadata_size
+        if delta_vectors is not None:
+            self.nbytes += delta_vectors.nbytes
+        # Sampling indexes by cluster count, built on demand for this generation
+        self.sampling: Dict[object, SamplingIndex] = {}
+
+
+class CategoryView:
+    """Read-only view of one category's vectors and metadata.
+
+    The view either owns a standalone index or points into a user's shared
+    pack, in which case searches are restricted to the category's id range.
+    Rows past the base index come from the append log and are searched
+    exhaustively; rows whose paragraph has a tombstone are never returned.
+    """
+
+    def __init__(self, index, data: _CategoryData, category_id: Optional[int] = None):
+        self.index = index
+        self.metadata = data.metadata
+        self.base_count = data.base_count
+        self.delta_vectors = data.delta_vectors
+        self.deleted = data.deleted
+        self.category_id = category_id
+        self._data = data
+
+    def live_metadata(self) -> List[Dict]:
+        if not self.deleted:
+            return self.metadata
+        return [entry for entry in self.metadata if entry["id"] not in self.deleted]
+
+    def vectors(self) -> np.ndarray:
+        """All vectors of the category, base and log, in metadata order."""
+        if self.category_id is None:
+            base = self.index.reconstruct_n(0, self.base_count)
+        else:
+            low = self.category_id << CATEGORY_ID_SHIFT
+            base = np.array(
+                [self.index.reconstruct(low + row) for row in range(self.base_count)],
+                dtype="float32",
+            ).reshape(-1, self.index.d)
+        if self.delta_vectors is None:
+            return base
+        return np.vstack([base, self.delta_vectors])
+
+    def sampling_index(
+        self, clusters: int = 0, assignments: Optional[Dict[str, int]] = None
+    ) -> SamplingIndex:
+        """Live rows and run boundaries, optionally with k-means cluster labels.
+
+        Persisted ``assignments`` (paragraph id -> cluster) are used as the
+        labels when given, otherwise ``clusters`` groups are trained here.
+        """
+        key = "assignments" if assignments is not None else clusters
+        sampling = self._data.sampling.get(key)
+        if sampling is not None:
+            return sampling
+
+        rows, run_starts = [], []
+        starts_run = True
+        for row, entry in enumerate(self.metadata):
+            # Every ingest batch starts at index 0, a deleted first paragraph
+            # moves the start of its run to the next live one
+            starts_run = starts_run or entry["index"] == 0
+            if entry["id"] in self.deleted:
+                continue
+            if starts_run:
+                run_starts.append(len(rows))
+                starts_run = False
+            rows.append(row)
+
+        groups = None
+        clusters = min(clusters, len(rows) // MIN_POINTS_PER_CLUSTER)
+        if assignments is not None:
+            groups = [assignments.get(self.metadata[row]["id"], -1) for row in rows]
+        elif clusters > 1:
+            vectors = np.ascontiguousarray(self.vectors()[rows])
+            kmeans = faiss.Kmeans(vectors.shape[1], clusters, niter=10, seed=1)
+            kmeans.train(vectors)
+            groups = kmeans.index.search(vectors, 1)[1][:, 0]
+
+        sampling = SamplingIndex(rows, run_starts, groups)
+        self._data.sampling[key] = sampling
+        return sampling
+
+    def _search_base(self, query_vector, k: int):
+        if self.category_id is None:
+            distances, rows = self.index.search(query_vector, k)
+            return distances[0], rows[0]
+
+        low = self.category_id << CATEGORY_ID_SHIFT
+        selector = faiss.IDSelectorRange(low, low + self.base_count)
+        params = faiss.SearchParameters(sel=selector)
+        distances, ids = self.index.search(query_vector, k, params=params)
+        rows = np.where(ids[0] >= 0, ids[0] - low, -1)
+        return distances[0], rows
+
+    def search(self, query_vector, n: int):
+        query_vector = np.array(query_vector).astype("float32").reshape(1, -1)
+        # Over-fetch from the base index so tombstoned hits can be dropped
+        k = min(n + len(self.deleted), self.base_count)
+        if k > 0:
+            distances, rows = self._search_base(query_vector, k)
+        else:
+            distances, rows = np.empty(0, "float32"), np.empty(0, "int64")
+
+        if self.delta_vectors is not None:
+            delta_distances = ((self.delta_vectors - query_vector) ** 2).sum(axis=1)
+            delta_rows = self.base_count + np.arange(len(self.delta_vectors))
+            distances = np.concatenate([distances, delta_distances])
+            rows = np.concatenate([rows, delta_rows])
+
+        keep = [
+            i
+            for i, row in enumerate(rows)
+            if row >= 0 and self.metadata[row]["id"] not in self.deleted
+        ]
+        order = sorted(keep, key=lambda i: distances[i])[:n]
+        return distances[order], rows[order]
+
+
+class _ResidentEntry:
+    def __init__(self, stamp, nbytes: int, index=None, data=None, members=None):
+        self.stamp = stamp
+        self.nbytes = nbytes
+        self.index = index
+        self.data = data
+        # For the shared pack: category -> (category_id, data)
+        self.members = members or {}
+
+
+class TenantIndexManager:
+    """Catalog of users and categories plus an LRU set of loaded indexes.
+
+    The catalog answers category listings without touching the disk unless the
+    user's directory changed. Loaded indexes are kept under a global memory
+    budget and evicted least-recently-used first. Categories whose index file is
+    below ``pack_threshold_bytes`` are loaded together into one shared per-user
+    index, so the long tail of tiny categories costs a single resident entry.
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        memory_budget_bytes: int = 512 * 1024 * 1024,
+        pack_threshold_bytes: int = 64 * 1024,
+        nprobe: int = 8,
+    ):
+        self.index_dir = index_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.pack_threshold_bytes = pack_threshold_bytes
+        self.nprobe = nprobe
+        self._catalog: Dict[str, Dict] = {}
+        self._resident: "OrderedDict[tuple, _ResidentEntry]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+
+    def _get_user_dir(self, user_id: str):
+        return f"{self.index_dir}/{user_id}"
+
+    def _get_index_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.index")
+
+    def _get_metadata_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.json")
+
+    def _get_generation_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.gen")
+
+    def _get_log_path(self, user_id: str, category: str):
+        return os.path.join(self._get_user_dir(user_id), f"{category}.log")
+
+    # --- Catalog ---
+
+    def _refresh_catalog(self, user_id: str) -> Dict:
+        user_dir = self._get_user_dir(user_id)
+        try:
+            mtime = os.stat(user_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._catalog.pop(user_id, None)
+            return {}
+
+        cached = self._catalog.get(user_id)
+        if cached is not None and cached["mtime"] == mtime:
+            return cached["categories"]
+
+        previous = cached["categories"] if cached else {}
+        categories = {}
+        with os.scandir(user_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".index"):
+                    continue
+                category = entry.name[: -len(".index")]
+                metadata_path = self._get_metadata_path(user_id, category)
+                try:
+                    metadata_size = os.path.getsize(metadata_path)
+                except FileNotFoundError:
+                    metadata_size = 0
+                categories[category] = {
+                    "size_bytes": entry.stat().st_size + metadata_size,
+                    "last_access": previous.get(category, {}).get("last_access"),
+                }
+        self._catalog[user_id] = {"mtime": mtime, "categories": categories}
+        return categories
+
+    def list_categories(self, user_id: str) -> List[str]:
+        with self._lock:
+            return sorted(self._refresh_catalog(user_id))
+
+    def get_catalog(self, user_id: str) -> Dict[str, Dict]:
+        with self._lock:
+            categories = self._refresh_catalog(user_id)
+            return {category: dict(entry) for category, entry in categories.items()}
+
+    def _is_packed(self, categories: Dict, category: str) -> bool:
+        return categories[category]["size_bytes"] <= self.pack_threshold_bytes
+
+    # --- Resident set ---
+
+    def _remember(self, key: tuple, entry: _ResidentEntry):
+        self._forget(key)
+        if entry.nbytes > self.memory_budget_bytes:
+            return
+        budget = self.memory_budget_bytes
+        while self._resident and self._resident_bytes + entry.nbytes > budget:
+            _, evicted = self._resident.popitem(last=False)
+            self._resident_bytes -= evicted.nbytes
+        self._resident[key] = entry
+        self._resident_bytes += entry.nbytes
+
+    def _forget(self, key: tuple):
+        entry = self._resident.pop(key, None)
+        if entry is not None:
+            self._resident_bytes -= entry.nbytes
+
+    def _read_category(self, user_id: str, category: str):
+        try:
+            index = faiss.read_index(self._get_index_path(user_id, category))
+            with open(self._get_metadata_path(user_id, category), "r") as f:
+                raw_metadata = f.read()
+        except (FileNotFoundError, RuntimeError):
+            # faiss raises RuntimeError for a missing file
+            return None
+        if isinstance(index, faiss.IndexIVF):
+            # Clustered categories probe the lists nearest to the query only
+            index.nprobe = min(self.nprobe, index.nlist)
+        delta_vectors, delta, deleted = read_log(self._get_log_path(user_id, category))
+        return _CategoryData(
+            index,
+            json.loads(raw_metadata),
+            len(raw_metadata),
+            delta_vectors,
+            delta,
+            deleted,
+        )
+
+    def _load_category(self, user_id: str, category: str):
+        """Read a category without locks, retrying across concurrent commits."""
+        with stage("index_load"):
+            return read_consistent(
+                self._get_generation_path(user_id, category),
+                lambda: self._read_category(user_id, category),
+            )
+
+    def _load_standalone(
+        self, user_id: str, category: str
+    ) -> Optional[_ResidentEntry]:
+        key = (user_id, category)
+        entry = self._resident.get(key)
+        generation_path = self._get_generation_path(user_id, category)
+        if entry is not None and entry.stamp == read_generation(generation_path):
+            self._resident.move_to_end(key)
+            return entry
+
+        generation, data = self._load_category(user_id, category)
+        if data is None:
+            return None
+        entry = _ResidentEntry(generation, data.nbytes, index=data.index, data=data)
+        self._remember(key, entry)
+        return entry
+
+    def _load_shared(self, user_id: str, categories: Dict) -> _ResidentEntry:
+        key = (user_id, SHARED_KEY)
+        members = sorted(c for c in categories if self._is_packed(categories, c))
+        stamp = tuple(
+            (c, read_generation(self._get_generation_path(user_id, c)))
+            for c in members
+        )
+        entry = self._resident.get(key)
+        if entry is not None and entry.stamp == stamp:
+            self._resident.move_to_end(key)
+            return entry
+
+        index = None
+        packed = {}
+        loaded_stamp = []
+        nbytes = 0
+        for category_id, category in enumerate(members):
+            generation, data = self._load_category(user_id, category)
+            loaded_stamp.append((category, generation))
+            if data is None:
+                continue
+            category_index = data.index
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(category_index.d))
+            if category_index.d != index.d or category_index.ntotal == 0:
+                # Mismatched dimensions cannot share a flat index, leave them out
+                continue
+            vectors = category_index.reconstruct_n(0, category_index.ntotal)
+            ids = (category_id << CATEGORY_ID_SHIFT) + np.arange(
+                category_index.ntotal, dtype="int64"
+            )
+            index.add_with_ids(vectors, ids)
+            # The shared index holds the vectors, drop the standalone copy
+            data.index = None
+            packed[category] = (category_id, data)
+            nbytes += data.nbytes + ids.nbytes
+
+        entry = _ResidentEntry(
+            tuple(loaded_stamp), nbytes, index=index, members=packed
+        )
+        self._remember(key, entry)
+        return entry
+
+    def get(self, user_id: str, category: str) -> Optional[CategoryView]:
+        with self._lock:
+            categories = self._refresh_catalog(user_id)
+            if category not in categories:
+                return None
+            categories[category]["last_access"] = time.time()
+
+            if self._is_packed(categories, category):
+                shared = self._load_shared(user_id, categories)
+                if category in shared.members:
+                    category_id, data = shared.members[category]
+                    return CategoryView(shared.index, data, category_id)
+
+            entry = self._load_standalone(user_id, category)
+            if entry is None:
+                return None
+            return CategoryView(entry.index, entry.data)
+
+    def invalidate(self, user_id: str, category: str):
+        with self._lock:
+            self._forget((user_id, category))
+            self._forget((user_id, SHARED_KEY))
+            cached = self._catalog.get(user_id)
+            if cached is not None:
+                # Files may be rewritten in place, which leaves the directory
+                # mtime untouched, so force a rescan on the next listing.
+                cached["mtime"] = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "resident_indexes": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "users": len(self._catalog),
+            }
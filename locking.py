@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows, fall back to in-process locking only
+    fcntl = None
+
+
+class ReadWriteLock:
+    """Writer-preferring reader-writer lock for threads of one process."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_shared(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_shared(self):
+        with self._condition:
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+
+    def acquire_exclusive(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_exclusive(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class FileLocks:
+    """Reader-writer locks keyed by lock file path.
+
+    Each lock is held both in-process (threads of one Streamlit server) and
+    across processes through ``fcntl.flock`` on the lock file.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, ReadWriteLock] = {}
+        self._guard = threading.Lock()
+
+    def _get_lock(self, lock_path: str) -> ReadWriteLock:
+        with self._guard:
+            lock = self._locks.get(lock_path)
+            if lock is None:
+                lock = self._locks[lock_path] = ReadWriteLock()
+            return lock
+
+    @contextmanager
+    def _file_lock(self, lock_path: str, operation):
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, "a") as f:
+            fcntl.flock(f.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def shared(self, lock_path: str):
+        lock = self._get_lock(lock_path)
+        lock.acquire_shared()
+        try:
+            with self._file_lock(lock_path, fcntl and fcntl.LOCK_SH):
+                yield
+        finally:
+            lock.release_shared()
+
+    @contextmanager
+    def exclusive(self, lock_path: str):
+        lock = self._get_lock(lock_path)
+        lock.acquire_exclusive()
+        try:
+            with self._file_lock(lock_path, fcntl and fcntl.LOCK_EX):
+                yield
+        finally:
+            lock.release_exclusive()
+
+
+def _temp_path(path: str) -> str:
+    return f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+
+def _fsync(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+@contextmanager
+def atomic_path(path: str):
+    """Yield a temporary path that replaces ``path`` atomically on success."""
+    temp_path = _temp_path(path)
+    try:
+        yield temp_path
+        _fsync(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def atomic_write_json(path: str, data):
+    with atomic_path(path) as temp_path:
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+
+
+def read_generation(path: str) -> int:
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_generation(path: str, generation: int):
+    with atomic_path(path) as temp_path:
+        with open(temp_path, "w") as f:
+            f.write(str(generation))
+
+
+@contextmanager
+def generation_commit(path: str, repair: Optional[Callable[[], None]] = None):
+    """Bump the generation around a multi-file commit.
+
+    The generation is odd while files are being swapped and even once the
+    commit is complete, so lock-free readers can detect a torn read and retry.
+    A commit that fails leaves the generation odd. The next writer then calls
+    ``repair`` to bring the files back to a consistent state before its own
+    commit. Must be called while holding the exclusive lock.
+    """
+    generation = read_generation(path)
+    if generation % 2 == 1:
+        # A previous writer failed or died mid-commit
+        if repair is not None:
+            repair()
+        generation += 1
+    write_generation(path, generation + 1)
+    yield generation + 2
+    write_generation(path, generation + 2)
+
+
+def read_consistent(
+    path: str, load: Callable, retries: int = 50, delay: float = 0.01
+) -> Tuple[int, object]:
+    """Run ``load`` until it observes a single, stable generation.
+
+    Readers never take a lock. If a commit is in progress or finishes while
+    loading, the load is retried. After ``retries`` attempts the last result is
+    returned anyway, since each file on its own is always swapped in whole.
+    """
+    for _ in range(retries):
+        before = read_generation(path)
+        if before % 2 == 1:
+            time.sleep(delay)
+            continue
+        result = load()
+        if read_generation(path) == before:
+            return before, result
+    return read_generation(path), load()
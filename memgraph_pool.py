@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import mgclient
+from gqlalchemy import Memgraph
+from gqlalchemy.exceptions import (
+    GQLAlchemyDatabaseError,
+    GQLAlchemyWaitForConnectionError,
+)
+
+# Memgraph reports serialization conflicts between concurrent writers with
+# these messages, retrying the query on a fresh transaction resolves them.
+TRANSIENT_MESSAGES = (
+    "Cannot resolve conflicting transactions",
+    "Unable to commit due to serialization error",
+)
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, GQLAlchemyWaitForConnectionError):
+        return True
+    transient_types = (mgclient.OperationalError, mgclient.InterfaceError)
+    if hasattr(mgclient, "TransientError"):
+        transient_types += (mgclient.TransientError,)
+    if isinstance(error.__cause__, transient_types):
+        return True
+    return any(message in str(error) for message in TRANSIENT_MESSAGES)
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class _PooledConnection:
+    def __init__(self, memgraph: Memgraph):
+        self.memgraph = memgraph
+        self.last_used = time.monotonic()
+
+
+class MemgraphPool:
+    """Bounded pool of Memgraph connections shared by all sessions.
+
+    Connections are opened lazily up to ``max_size`` and checked out for the
+    duration of one call. Idle connections are health-checked before reuse,
+    and queries failing with a transient error are retried on a new connection.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 8,
+        checkout_timeout: float = 10.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.2,
+        health_check_after: float = 30.0,
+        **connection_kwargs,
+    ):
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.health_check_after = health_check_after
+        self._connection_kwargs = connection_kwargs
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._in_use = 0
+        self._metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "retries": 0,
+            "failed_health_checks": 0,
+            "discarded": 0,
+        }
+
+    def _open(self) -> _PooledConnection:
+        return _PooledConnection(Memgraph(**self._connection_kwargs))
+
+    def _is_healthy(self, connection: _PooledConnection) -> bool:
+        if time.monotonic() - connection.last_used < self.health_check_after:
+            return True
+        try:
+            list(connection.memgraph.execute_and_fetch("RETURN 1 AS ok"))
+            return True
+        except Exception:
+            with self._lock:
+                self._metrics["failed_health_checks"] += 1
+            return False
+
+    def _discard(self):
+        with self._lock:
+            self._size -= 1
+            self._metrics["discarded"] += 1
+
+    def _acquire(self) -> _PooledConnection:
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = None
+                with self._lock:
+                    can_open = self._size < self.max_size
+                    if can_open:
+                        self._size += 1
+                if can_open:
+                    try:
+                        connection = self._open()
+                    except Exception:
+                        self._discard()
+                        raise
+                else:
+                    waited = True
+                    remaining = deadline - time.monotonic()
+                    try:
+                        connection = self._idle.get(timeout=max(remaining, 0))
+                    except queue.Empty:
+                        with self._lock:
+                            self._metrics["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No Memgraph connection available after "
+                            f"{self.checkout_timeout}s ({self.max_size} in use)"
+                        )
+
+            if not self._is_healthy(connection):
+                self._discard()
+                continue
+
+            with self._lock:
+                self._in_use += 1
+                self._metrics["checkouts"] += 1
+                if waited:
+                    self._metrics["waits"] += 1
+                    self._metrics["wait_seconds"] += time.monotonic() - started
+            return connection
+
+    def _release(self, connection: _PooledConnection, broken: bool):
+        with self._lock:
+            self._in_use -= 1
+        if broken:
+            self._discard()
+            return
+        connection.last_used = time.monotonic()
+        self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for several statements, without retries."""
+        connection = self._acquire()
+        broken = False
+        try:
+            yield connection.memgraph
+        except Exception as e:
+            broken = is_transient(e)
+            raise
+        finally:
+            self._release(connection, broken)
+
+    def _run(self, query: str, parameters: Optional[Dict], fetch: bool):
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as memgraph:
+                    parameters = parameters or {}
+                    if fetch:
+                        # Results are consumed before the connection is returned
+                        return list(memgraph.execute_and_fetch(query, parameters))
+                    memgraph.execute(query, parameters)
+                    return None
+            except (GQLAlchemyDatabaseError, GQLAlchemyWaitForConnectionError) as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self._metrics["retries"] += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+    def execute(self, query: str, parameters: Optional[Dict] = None):
+        self._run(query, parameters, fetch=False)
+
+    def execute_and_fetch(
+        self, query: str, parameters: Optional[Dict] = None
+    ) -> List[Dict]:
+        return self._run(query, parameters, fetch=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "open": self._size,
+                "in_use": self._in_use,
+                "idle": self._size - self._in_use,
+                "utilization": self._in_use / self.max_size,
+                **self._metrics,
+            }
@@ -1,139 +1,641 @@
-from gqlalchemy import Memgraph
-from storage import Storage
-import random
+from gqlalchemy.exceptions import GQLAlchemyDatabaseError
+from memgraph_pool import MemgraphPool
+from sampling import SamplingIndex
+from storage import CLUSTER_STALE_FRACTION, CategoryStats, ClusterSummary, Paragraph, Storage, merge_windows
+from collections import OrderedDict
+import bisect
+import hashlib
+import json
+import math
+import os
 import uuid
 
-from typing import List
+from typing import Dict, List, Optional
+
+# Paragraphs are written and deleted in chunks so a large category never turns
+# into one huge transaction.
+BATCH_SIZE = 500
+# Categories whose live paragraph indexes are kept for quiz sampling
+SAMPLING_CACHE_SIZE = 64
+
+
+def tenant_label(user_id: str) -> str:
+    # User IDs are free text, hash them into a valid Cypher label
+    return "Tenant_" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+
+
+def tenant_vector_index(user_id: str) -> str:
+    return f"{tenant_label(user_id).lower()}_vector_index"
+
 
 class MemgraphStorage(Storage):
+    """Memgraph storage shared by all users.
+
+    Every paragraph is a ``:Paragraph`` node carrying ``user_id`` and ``category``
+    plus a per-user tenant label, which backs one vector index per user. Each
+    category also has an indexed ``:Category`` catalog node, so listing and
+    replacing categories never scans or drops the whole graph.
+    """
+
     def __init__(self):
         super().__init__()
-        self._memgraph = Memgraph()
-        self._memgraph.execute("CREATE INDEX ON :All")
+        self._pool = MemgraphPool(
+            max_size=int(os.getenv("KS_MEMGRAPH_POOL_SIZE", "8")),
+            checkout_timeout=float(os.getenv("KS_MEMGRAPH_CHECKOUT_TIMEOUT", "10")),
+            max_retries=int(os.getenv("KS_MEMGRAPH_RETRIES", "3")),
+        )
+        self._vector_capacity = int(os.getenv("KS_MEMGRAPH_VECTOR_CAPACITY", "100000"))
+        self._vector_indexes = set()
+        self._tenant_indexes = set()
+        self._sampling_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._pool.execute("CREATE INDEX ON :Paragraph(id)")
+        self._pool.execute("CREATE INDEX ON :Paragraph(user_id)")
+        self._pool.execute("CREATE INDEX ON :Category(user_id)")
+
+    def get_pool_stats(self):
+        return self._pool.stats()
 
     def initialize_user(self, user_id: str):
         pass
-    
+
+    def _ensure_vector_index(self, memgraph, user_id: str, dimension: int):
+        index_name = tenant_vector_index(user_id)
+        if index_name in self._vector_indexes:
+            return
+        try:
+            memgraph.execute(f"""
+                CREATE VECTOR INDEX {index_name} ON :{tenant_label(user_id)}(vector)
+                WITH CONFIG {{
+                    "dimension": {dimension},
+                    "capacity": {self._vector_capacity},
+                    "metric": "cos"
+                }}
+            """)
+        except GQLAlchemyDatabaseError as e:
+            if "already exists" not in str(e):
+                raise
+        self._vector_indexes.add(index_name)
+
+    def _ensure_tenant_index(self, memgraph, user_id: str):
+        # Lets sampling look paragraphs up by position within one tenant
+        if user_id in self._tenant_indexes:
+            return
+        memgraph.execute(f"CREATE INDEX ON :{tenant_label(user_id)}(index)")
+        self._tenant_indexes.add(user_id)
+
     def get_all_categories(self, user_id: str):
-        results = self._memgraph.execute_and_fetch("""
-            MATCH (n) 
-            WITH labels(n) AS l
-            UNWIND l AS ll
-            RETURN DISTINCT ll AS label
-            ORDER BY label"""
-        )
-        return [record["label"] for record in results]
-    
-    def get_similar_documents(self, user_id: str, category: str, query_vector: str, n: int):
-        results = self._memgraph.execute_and_fetch(
-            f"""
-            CALL vector_search.search("{category.lower()}_vector_index", {n}, $query_vector)
+        results = self._pool.execute_and_fetch(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            RETURN c.name AS name
+            ORDER BY name
+            """,
+            {"user_id": user_id}
+        )
+        return [record["name"] for record in results]
+
+    def _search_limit(self, user_id: str, category: str, n: int) -> int:
+        # The vector index spans all of a user's categories, so over-fetch in
+        # proportion to how much of the tenant this category makes up.
+        results = self._pool.execute_and_fetch(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            RETURN sum(c.paragraphs) AS total,
+                   sum(CASE WHEN c.name = $category THEN c.paragraphs ELSE 0 END) AS paragraphs
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        total = results[0]["total"] if results else 0
+        paragraphs = results[0]["paragraphs"] if results else 0
+        if not total or not paragraphs:
+            return 0
+        return min(total, math.ceil(n * total / paragraphs))
+
+    def _filtered_search(self, user_id: str, limit: int, n: int) -> str:
+        return f"""
+            CALL vector_search.search("{tenant_vector_index(user_id)}", {limit}, $query_vector)
             YIELD node, similarity
+            WITH node, similarity
+            WHERE node.user_id = $user_id AND node.category = $category
+              AND ($lang_prefix IS NULL OR node.lang_prefix = $lang_prefix)
+            WITH node, similarity
+            ORDER BY similarity DESC
+            LIMIT {n}
+        """
+
+    def get_similar_documents(self, user_id: str, category: str, query_vector: List[float], n: int, lang_prefix: Optional[str] = None):
+        limit = self._search_limit(user_id, category, n)
+        if limit == 0:
+            return []
+
+        results = self._pool.execute_and_fetch(
+            self._filtered_search(user_id, limit, n) + """
             RETURN node.content AS content, similarity
             """,
-            {"query_vector": query_vector}
+            {
+                "query_vector": query_vector,
+                "user_id": user_id,
+                "category": category,
+                "lang_prefix": lang_prefix,
+            }
         )
-        
+
         return results
 
-    def get_paragraph_ids(self, user_id: str, category: str) -> List[int]:
-        ids = list(self._memgraph.execute_and_fetch(f"MATCH (p:{category}) RETURN p.id AS id"))
-        return [x["id"] for x in ids]
-    
-    def sample_n_connected_paragraphs(self, user_id: str, category: str, number_of_questions: int):
-        ids = self.get_paragraph_ids(category)
-        if not len(ids):
+    def get_similar_documents_with_context(self, user_id: str, category: str, query_vector: List[float], n: int, window: int, lang_prefix: Optional[str] = None):
+        if window <= 0:
+            return [
+                {"content": r["content"], "similarity": r["similarity"]}
+                for r in self.get_similar_documents(user_id, category, query_vector, n, lang_prefix)
+            ]
+
+        limit = self._search_limit(user_id, category, n)
+        if limit == 0:
+            return []
+
+        results = self._pool.execute_and_fetch(
+            self._filtered_search(user_id, limit, n) + f"""
+            OPTIONAL MATCH (prev:Paragraph)-[:NEXT *1..{window}]->(node)
+            WITH node, similarity, collect(prev) AS before
+            OPTIONAL MATCH (node)-[:NEXT *1..{window}]->(next:Paragraph)
+            WITH node, similarity, before, collect(next) AS after
+            UNWIND before + [node] + after AS p
+            RETURN node.id AS hit, similarity, p.id AS id, p.index AS position, p.content AS content
+            """,
+            {
+                "query_vector": query_vector,
+                "user_id": user_id,
+                "category": category,
+                "lang_prefix": lang_prefix,
+            }
+        )
+
+        windows = {}
+        for record in results:
+            window_record = windows.setdefault(
+                record["hit"], {"similarity": record["similarity"], "paragraphs": []}
+            )
+            window_record["paragraphs"].append((record["id"], record["position"], record["content"]))
+
+        return merge_windows(list(windows.values()))
+
+    def get_paragraph_ids(self, user_id: str, category: str) -> List[str]:
+        results = self._pool.execute_and_fetch(
+            """
+            MATCH (p:Paragraph {user_id: $user_id})
+            WHERE p.category = $category
+            RETURN p.id AS id
+            ORDER BY p.index ASC
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        return [x["id"] for x in results]
+
+    def _sampling_index(self, user_id: str, category: str) -> Optional[SamplingIndex]:
+        catalog = self._pool.execute_and_fetch(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            RETURN c.paragraphs AS paragraphs, c.next_index AS next_index, c.run_starts AS run_starts
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        if not catalog or not catalog[0]["paragraphs"]:
+            return None
+
+        run_starts = catalog[0]["run_starts"]
+        if run_starts is None:
+            # Categories ingested before run_starts was kept get it backfilled once
+            run_starts = self._pool.execute_and_fetch(
+                """
+                MATCH (p:Paragraph {user_id: $user_id})
+                WHERE p.category = $category AND NOT ()-[:NEXT]->(p)
+                WITH p ORDER BY p.index ASC
+                WITH collect(p.index) AS run_starts
+                MATCH (c:Category {user_id: $user_id})
+                WHERE c.name = $category
+                SET c.run_starts = run_starts
+                RETURN run_starts
+                """,
+                {"user_id": user_id, "category": category}
+            )[0]["run_starts"]
+            if not run_starts:
+                return None
+            with self._pool.connection() as memgraph:
+                self._ensure_tenant_index(memgraph, user_id)
+
+        # Every append raises next_index and every delete lowers paragraphs, so
+        # the pair tells whether the cached live indexes are still current
+        key = (user_id, category)
+        stamp = (catalog[0]["paragraphs"], catalog[0]["next_index"], len(run_starts))
+        cached = self._sampling_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            self._sampling_cache.move_to_end(key)
+            return cached[1]
+
+        # Positions map onto the live paragraph indexes, so deleted paragraphs
+        # are skipped instead of leaving holes in the windows
+        offsets = self._pool.execute_and_fetch(
+            f"""
+            MATCH (p:{tenant_label(user_id)})
+            WHERE p.category = $category
+            WITH p.index AS position ORDER BY position ASC
+            RETURN collect(position) AS offsets
+            """,
+            {"category": category}
+        )[0]["offsets"]
+        if not offsets:
+            return None
+        # A run whose first paragraphs were deleted starts at its next live one
+        starts = sorted({bisect.bisect_left(offsets, start) for start in run_starts} - {len(offsets)})
+        sampling = SamplingIndex(offsets, starts or [0])
+
+        self._sampling_cache[key] = (stamp, sampling)
+        if len(self._sampling_cache) > SAMPLING_CACHE_SIZE:
+            self._sampling_cache.popitem(last=False)
+        return sampling
+
+    def sample_n_connected_paragraphs(self, user_id: str, category: str, number_of_questions: int, seed: Optional[int] = None, diverse: bool = False):
+        sampling = self._sampling_index(user_id, category)
+        if sampling is None:
             return None
 
-        start_ids = random.sample(ids, k=number_of_questions)
-        results = self._memgraph.execute_and_fetch(
+        positions = sampling.sample_offsets(number_of_questions, seed=seed, diverse=diverse)
+        results = self._pool.execute_and_fetch(
             f"""
-            UNWIND $ids AS id
-            MATCH path=(p:{category} {{id: id}})-[:NEXT *bfs 0..5]->(next)
-            WITH project(path) as graph
-            UNWIND graph.nodes as nodes
-            RETURN nodes.content AS content
-            ORDER BY nodes.index ASC
+            MATCH (p:{tenant_label(user_id)})
+            WHERE p.index IN $positions AND p.category = $category
+            RETURN p.content AS content
+            ORDER BY p.index ASC
             """,
-            {"ids": start_ids}
+            {"positions": positions, "category": category}
         )
-        return results
-    
-    def ingest_paragraphs(self, user_id: str, category: str, paragraphs: List, embeddings: List, lang_prefix: str, mode: str):
-        if mode == "replace":
-            self._memgraph.execute("STORAGE MODE IN_MEMORY_ANALYTICAL")
-            self._memgraph.execute("DROP GRAPH")
-            self._memgraph.execute("CREATE INDEX ON :All")
-
-        paragraph_nodes = []
-        for idx, (text, vector) in enumerate(zip(paragraphs, embeddings)):
-            para_id = str(uuid.uuid4())
-            vector_list = vector.tolist()
-            content = text.strip()
-
-            # Create the paragraph node
-            self._memgraph.execute(
+        return results or None
+
+    def _delete_category_paragraphs(self, memgraph, user_id: str, category: str):
+        while True:
+            results = list(memgraph.execute_and_fetch(
                 f"""
-                CREATE (p:{category}:All {{
-                    id: $id,
-                    content: $content,
-                    page: $page,
-                    index: $idx,
-                    vector: $vector,
-                    lang_prefix: $lang_prefix
-                }})
+                MATCH (p:Paragraph {{user_id: $user_id}})
+                WHERE p.category = $category
+                WITH p LIMIT {BATCH_SIZE}
+                DETACH DELETE p
+                RETURN count(*) AS deleted
+                """,
+                {"user_id": user_id, "category": category}
+            ))
+            if not results or results[0]["deleted"] == 0:
+                break
+        memgraph.execute(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            SET c.paragraphs = 0, c.run_starts = [], c.centroids = null, c.cluster_representatives = null, c.sync_state = null
+            """,
+            {"user_id": user_id, "category": category}
+        )
+
+    def ingest_paragraphs(self, user_id: str, category: str, paragraphs: List, embeddings: List, lang_prefix: str, mode: str, ids: Optional[List[str]] = None, sections: Optional[List[str]] = None):
+        # One connection for the whole ingest keeps the statements in order
+        with self._pool.connection() as memgraph:
+            if mode == "replace":
+                # Only this user's category goes, other tenants are untouched
+                self._delete_category_paragraphs(memgraph, user_id, category)
+
+            catalog = list(memgraph.execute_and_fetch(
+                """
+                MERGE (c:Category {user_id: $user_id, name: $category})
+                ON CREATE SET c.paragraphs = 0, c.next_index = 0, c.run_starts = []
+                SET c.lang_prefix = $lang_prefix
+                RETURN c.next_index AS next_index
+                """,
+                {"user_id": user_id, "category": category, "lang_prefix": lang_prefix}
+            ))
+            # Positions keep growing across appends so ordering stays global
+            first_index = catalog[0]["next_index"] or 0
+
+            rows = [
+                {
+                    "id": ids[idx] if ids else str(uuid.uuid4()),
+                    "content": text.strip(),
+                    "index": first_index + idx,
+                    "section": sections[idx] if sections else None,
+                    "vector": vector.tolist(),
+                }
+                for idx, (text, vector) in enumerate(zip(paragraphs, embeddings))
+            ]
+
+            for start in range(0, len(rows), BATCH_SIZE):
+                memgraph.execute(
+                    f"""
+                    UNWIND $rows AS row
+                    CREATE (p:Paragraph:{tenant_label(user_id)} {{
+                        id: row.id,
+                        user_id: $user_id,
+                        category: $category,
+                        content: row.content,
+                        page: $category,
+                        index: row.index,
+                        section: row.section,
+                        vector: row.vector,
+                        lang_prefix: $lang_prefix
+                    }})
+                    """,
+                    {
+                        "rows": rows[start:start + BATCH_SIZE],
+                        "user_id": user_id,
+                        "category": category,
+                        "lang_prefix": lang_prefix
+                    }
+                )
+
+            # Create :NEXT relationships between consecutive paragraphs
+            pairs = [[a["id"], b["id"]] for a, b in zip(rows[:-1], rows[1:])]
+            for start in range(0, len(pairs), BATCH_SIZE):
+                memgraph.execute(
+                    """
+                    UNWIND $pairs AS pair
+                    MATCH (p1:Paragraph {id: pair[0]}), (p2:Paragraph {id: pair[1]})
+                    WHERE p1.user_id = $user_id AND p1.category = $category
+                      AND p2.user_id = $user_id AND p2.category = $category
+                    CREATE (p1)-[:NEXT]->(p2)
+                    """,
+                    {"pairs": pairs[start:start + BATCH_SIZE], "user_id": user_id, "category": category}
+                )
+
+            memgraph.execute(
+                """
+                MATCH (c:Category {user_id: $user_id})
+                WHERE c.name = $category
+                SET c.paragraphs = c.paragraphs + $count, c.next_index = $next_index,
+                    c.run_starts = CASE WHEN $count = 0 OR c.run_starts IS NULL THEN c.run_starts ELSE c.run_starts + [$first_index] END
                 """,
                 {
-                    "id": para_id,
-                    "content": content,
-                    "page": category,
-                    "idx": idx,
-                    "vector": vector_list,
-                    "lang_prefix": lang_prefix
+                    "user_id": user_id,
+                    "category": category,
+                    "count": len(rows),
+                    "first_index": first_index,
+                    "next_index": first_index + len(rows),
                 }
             )
-            paragraph_nodes.append((para_id, idx))
 
-        # Create :NEXT relationships between consecutive paragraphs
-        for (id1, _), (id2, _) in zip(paragraph_nodes[:-1], paragraph_nodes[1:]):
-            self._memgraph.execute(
+            if rows:
+                self._ensure_vector_index(memgraph, user_id, len(rows[0]["vector"]))
+                self._ensure_tenant_index(memgraph, user_id)
+
+            if mode != "replace":
+                self._drop_stale_clusters(memgraph, user_id, category)
+
+            return len(paragraphs)
+
+    def get_all_paragraphs(self, user_id: str, category: str) -> List[Paragraph]:
+        results = self._pool.execute_and_fetch(
+            """
+            MATCH (p:Paragraph {user_id: $user_id})
+            WHERE p.category = $category
+            RETURN p.content AS content, p.id as id
+            ORDER BY p.index ASC
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        return [{"content": record["content"], "id": record["id"]} for record in results]
+
+    def iter_paragraph_records(self, user_id: str, category: str, batch_size: int = 1024):
+        after = -1
+        while True:
+            results = self._pool.execute_and_fetch(
                 f"""
-                MATCH (p1:{category} {{id: $id1}}), (p2:{category} {{id: $id2}})
-                CREATE (p1)-[:NEXT]->(p2)
+                MATCH (p:Paragraph {{user_id: $user_id}})
+                WHERE p.category = $category AND p.index > $after
+                WITH p
+                ORDER BY p.index ASC
+                LIMIT {batch_size}
+                OPTIONAL MATCH (prev:Paragraph)-[:NEXT]->(p)
+                RETURN p.id AS id, p.content AS content, p.index AS position,
+                       prev IS NULL AS run_start, p.lang_prefix AS lang_prefix,
+                       p.section AS section, p.vector AS vector
+                ORDER BY position ASC
                 """,
-                {"id1": id1, "id2": id2}
+                {"user_id": user_id, "category": category, "after": after}
             )
+            if not results:
+                return
+            yield results
+            after = results[-1]["position"]
+
+    def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
+        # Bridge the :NEXT chain over the removed paragraph
+        self._pool.execute(
+            """
+            MATCH (p:Paragraph {id: $id})
+            WHERE p.user_id = $user_id AND p.category = $category
+            OPTIONAL MATCH (prev)-[:NEXT]->(p)
+            OPTIONAL MATCH (p)-[:NEXT]->(next)
+            FOREACH (_ IN CASE WHEN prev IS NOT NULL AND next IS NOT NULL THEN [1] ELSE [] END |
+                CREATE (prev)-[:NEXT]->(next))
+            DETACH DELETE p
+            WITH count(*) AS deleted
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            SET c.paragraphs = c.paragraphs - deleted
+            """,
+            {"id": paragraph_id, "user_id": user_id, "category": category}
+        )
+
+    def delete_paragraphs(self, user_id: str, category: str, paragraph_ids: List[str]) -> int:
+        ids = list(dict.fromkeys(paragraph_ids))
+        with self._pool.connection() as memgraph:
+            links = []
+            for start in range(0, len(ids), BATCH_SIZE):
+                links.extend(memgraph.execute_and_fetch(
+                    """
+                    UNWIND $ids AS id
+                    MATCH (p:Paragraph {id: id})
+                    WHERE p.user_id = $user_id AND p.category = $category
+                    OPTIONAL MATCH (prev)-[:NEXT]->(p)
+                    OPTIONAL MATCH (p)-[:NEXT]->(next)
+                    RETURN p.id AS id, prev.id AS prev, next.id AS next
+                    """,
+                    {"ids": ids[start:start + BATCH_SIZE], "user_id": user_id, "category": category}
+                ))
+            if not links:
+                return 0
 
-        dimension = len(embeddings[0])
-        capacity = len(embeddings) * 2
+            # Every deleted stretch of the :NEXT chain is bridged by one edge
+            following = {link["id"]: link["next"] for link in links}
+            bridges = []
+            for link in links:
+                if link["prev"] is None or link["prev"] in following:
+                    continue
+                next_id = link["next"]
+                while next_id in following:
+                    next_id = following[next_id]
+                if next_id is not None:
+                    bridges.append([link["prev"], next_id])
 
-        index_name = f"{category.lower()}_vector_index"
-        self._memgraph.execute(f"""
-            CREATE VECTOR INDEX {index_name} ON :{category}(vector)
-            WITH CONFIG {{
-                "dimension": {dimension},
-                "capacity": {capacity},
-                "metric": "cos"
-            }}
-        """)
+            for start in range(0, len(bridges), BATCH_SIZE):
+                memgraph.execute(
+                    """
+                    UNWIND $pairs AS pair
+                    MATCH (p1:Paragraph {id: pair[0]}), (p2:Paragraph {id: pair[1]})
+                    WHERE p1.user_id = $user_id AND p1.category = $category
+                      AND p2.user_id = $user_id AND p2.category = $category
+                    CREATE (p1)-[:NEXT]->(p2)
+                    """,
+                    {"pairs": bridges[start:start + BATCH_SIZE], "user_id": user_id, "category": category}
+                )
 
-        return len(paragraphs)
+            doomed = list(following)
+            for start in range(0, len(doomed), BATCH_SIZE):
+                memgraph.execute(
+                    """
+                    UNWIND $ids AS id
+                    MATCH (p:Paragraph {id: id})
+                    WHERE p.user_id = $user_id AND p.category = $category
+                    DETACH DELETE p
+                    """,
+                    {"ids": doomed[start:start + BATCH_SIZE], "user_id": user_id, "category": category}
+                )
+
+            memgraph.execute(
+                """
+                MATCH (c:Category {user_id: $user_id})
+                WHERE c.name = $category
+                SET c.paragraphs = c.paragraphs - $count
+                """,
+                {"user_id": user_id, "category": category, "count": len(doomed)}
+            )
+            return len(doomed)
+
+    def _drop_stale_clusters(self, memgraph, user_id: str, category: str):
+        # Paragraphs keep their old cluster, it is overwritten by the next run
+        memgraph.execute(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category AND c.cluster_representatives IS NOT NULL
+            MATCH (p:Paragraph {user_id: $user_id})
+            WHERE p.category = $category AND p.cluster IS NULL
+            WITH c, count(p) AS unassigned
+            WHERE unassigned > $fraction * c.paragraphs
+            SET c.centroids = null, c.cluster_representatives = null
+            """,
+            {"user_id": user_id, "category": category, "fraction": CLUSTER_STALE_FRACTION}
+        )
 
-    def get_all_paragraphs(self, user_id: str, category: str) -> List[str]:
-        results = self._memgraph.execute_and_fetch(
+    def save_clusters(self, user_id: str, category: str, centroids, assignments: Dict[str, int], representatives: List[str]):
+        rows = [{"id": paragraph_id, "cluster": int(cluster)} for paragraph_id, cluster in assignments.items()]
+        with self._pool.connection() as memgraph:
+            for start in range(0, len(rows), BATCH_SIZE):
+                memgraph.execute(
+                    """
+                    UNWIND $rows AS row
+                    MATCH (p:Paragraph {id: row.id})
+                    WHERE p.user_id = $user_id AND p.category = $category
+                    SET p.cluster = row.cluster
+                    """,
+                    {"rows": rows[start:start + BATCH_SIZE], "user_id": user_id, "category": category}
+                )
+            memgraph.execute(
+                """
+                MATCH (c:Category {user_id: $user_id})
+                WHERE c.name = $category
+                SET c.centroids = $centroids, c.cluster_representatives = $representatives
+                """,
+                {"user_id": user_id, "category": category, "centroids": [list(map(float, c)) for c in centroids], "representatives": representatives}
+            )
+
+    def get_clusters(self, user_id: str, category: str) -> Optional[List[ClusterSummary]]:
+        catalog = self._pool.execute_and_fetch(
+            """
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            RETURN c.cluster_representatives AS representatives
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        if not catalog or catalog[0]["representatives"] is None:
+            return None
+
+        # Paragraphs appended after clustering have no cluster yet
+        results = self._pool.execute_and_fetch(
+            """
+            MATCH (p:Paragraph {user_id: $user_id})
+            WHERE p.category = $category
+            WITH coalesce(p.cluster, -1) AS cluster, p
+            ORDER BY p.index ASC
+            RETURN cluster, count(p) AS size, collect(p.content)[0] AS first_content
+            ORDER BY cluster ASC
+            """,
+            {"user_id": user_id, "category": category}
+        )
+        representatives = catalog[0]["representatives"]
+        previews = {
+            record["id"]: record["content"]
+            for record in self._pool.execute_and_fetch(
+                """
+                UNWIND $ids AS id
+                MATCH (p:Paragraph {id: id})
+                WHERE p.user_id = $user_id AND p.category = $category
+                RETURN p.id AS id, p.content AS content
+                """,
+                {"ids": representatives, "user_id": user_id, "category": category}
+            )
+        }
+        return [
+            {
+                "cluster": record["cluster"],
+                "size": record["size"],
+                "preview": previews.get(representatives[record["cluster"]], record["first_content"]) if record["cluster"] >= 0 else record["first_content"],
+            }
+            for record in results
+        ]
+
+    def get_cluster_paragraphs(self, user_id: str, category: str, cluster: int, offset: int, limit: int) -> List[Paragraph]:
+        results = self._pool.execute_and_fetch(
             f"""
-            MATCH (p:{category})
-            RETURN p.content AS content, p.id as id
+            MATCH (p:Paragraph {{user_id: $user_id}})
+            WHERE p.category = $category AND coalesce(p.cluster, -1) = $cluster
+            RETURN p.content AS content, p.id AS id
             ORDER BY p.index ASC
+            SKIP {int(offset)} LIMIT {int(limit)}
+            """,
+            {"user_id": user_id, "category": category, "cluster": cluster}
+        )
+        return [{"content": record["content"], "id": record["id"]} for record in results]
+
+    def describe_category(self, user_id: str, category: str) -> Optional[CategoryStats]:
+        results = self._pool.execute_and_fetch(
             """
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            RETURN c.paragraphs AS paragraphs
+            """,
+            {"user_id": user_id, "category": category}
         )
-        return [{"content": record["content"], "id": record[id]} for record in results]
+        if not results:
+            return None
+        # Every tenant has one vector index, searched with a category filter
+        return {"paragraphs": results[0]["paragraphs"], "index_type": tenant_vector_index(user_id)}
 
-    def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
-        self._memgraph.execute(
+    def get_sync_state(self, user_id: str, category: str) -> Optional[Dict]:
+        results = self._pool.execute_and_fetch(
             """
-            MATCH (p {id: $id})
-            DETACH DELETE p
+            MATCH (c:Category {user_id: $user_id})
+            WHERE c.name = $category
+            RETURN c.sync_state AS sync_state
             """,
-            {"id": paragraph_id}
-        )
\ No newline at end of file
+            {"user_id": user_id, "category": category}
+        )
+        if not results or results[0]["sync_state"] is None:
+            return None
+        return json.loads(results[0]["sync_state"])
+
+    def set_sync_state(self, user_id: str, category: str, state: Dict):
+        self._pool.execute(
+            """
+            MERGE (c:Category {user_id: $user_id, name: $category})
+            ON CREATE SET c.paragraphs = 0, c.next_index = 0, c.run_starts = []
+            SET c.sync_state = $sync_state
+            """,
+            {"user_id": user_id, "category": category, "sync_state": json.dumps(state)}
+        )
@@ -0,0 +1,188 @@
+"""Opt-in per-request profiling of the chat pipeline.
+
+With ``KS_PROFILE=1`` every request wrapped in ``profile_query`` records how
+long each ``stage`` took (embedding, storage, index loads, LLM). A request
+slower than ``KS_SLOW_QUERY_MS`` is appended to a rotating JSONL log together
+with its cProfile output and, when the caller registered one with
+``describe``, the size and index type of the queried category. Without
+``KS_PROFILE`` the helpers are no-ops.
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, List, Optional
+
+# Functions listed per profile, by cumulative time
+PROFILE_LINES = 25
+
+_current = contextvars.ContextVar("ks_query_profile", default=None)
+# Only one cProfile profiler can be active per process at a time
+_profiler_lock = threading.Lock()
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.getenv("KS_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def slow_query_ms() -> float:
+    return float(os.getenv("KS_SLOW_QUERY_MS", "2000"))
+
+
+def log_path() -> str:
+    return os.getenv("KS_SLOW_QUERY_LOG", "slow_queries.jsonl")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Check ``token`` against ``KS_ADMIN_TOKEN``, nobody is admin without one."""
+    expected = os.getenv("KS_ADMIN_TOKEN", "")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            handler = RotatingFileHandler(
+                log_path(),
+                maxBytes=int(os.getenv("KS_SLOW_QUERY_LOG_KB", "1024")) * 1024,
+                backupCount=int(os.getenv("KS_SLOW_QUERY_LOG_BACKUPS", "3")),
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("ks.slow_queries")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+class QueryProfile:
+    def __init__(self, name: str, fields: Dict):
+        self.name = name
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.describers: List[Callable[[], Dict]] = []
+
+    def add_stage(self, stage: str, ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+
+@contextmanager
+def profile_query(name: str, **fields):
+    """Profile one request, nested requests count as stages of the outer one."""
+    if not enabled() or _current.get() is not None:
+        with stage(name):
+            yield
+        return
+
+    profile = QueryProfile(name, fields)
+    token = _current.set(profile)
+    profiler = None
+    if _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        total_ms = (time.perf_counter() - started) * 1000
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        _current.reset(token)
+        if total_ms >= slow_query_ms():
+            _log_slow_query(profile, total_ms, profiler, error)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request, a no-op outside ``profile_query``."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, (time.perf_counter() - started) * 1000)
+
+
+def describe(callback: Callable[[], Dict]):
+    """Register a callback adding fields to the record if the request is slow."""
+    profile = _current.get()
+    if profile is not None:
+        profile.describers.append(callback)
+
+
+def _profile_text(profiler: cProfile.Profile) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return stream.getvalue()
+
+
+def _log_slow_query(
+    profile: QueryProfile,
+    total_ms: float,
+    profiler: Optional[cProfile.Profile],
+    error: Optional[str],
+):
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "name": profile.name,
+        "total_ms": round(total_ms, 1),
+        "stages": {name: round(ms, 1) for name, ms in profile.stages.items()},
+        **profile.fields,
+    }
+    for callback in profile.describers:
+        try:
+            record.update(callback())
+        except Exception as e:
+            print(f"⚠️ Could not describe slow query: {e}")
+    if error is not None:
+        record["error"] = error
+    if profiler is not None:
+        record["profile"] = _profile_text(profiler)
+    _get_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def read_slow_queries(limit: int = 50) -> List[Dict]:
+    """Return the newest slow-query records first, across rotated files."""
+    path = log_path()
+    backups = int(os.getenv("KS_SLOW_QUERY_LOG_BACKUPS", "3"))
+    records = []
+    for name in [path] + [f"{path}.{i}" for i in range(1, backups + 1)]:
+        try:
+            with open(name, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            continue
+        for line in reversed(lines):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A line cut short by a crash mid-write
+                continue
+            if len(records) >= limit:
+                return records
+    return records
@@ -0,0 +1,102 @@
+import bisect
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Paragraphs per sampled window, a window never crosses a run boundary
+SAMPLE_WINDOW = 3
+
+
+class SamplingIndex:
+    """Paragraph offsets of one category plus the boundaries of its runs.
+
+    A run is a stretch of connected paragraphs, i.e. one ingest batch. Sampling
+    works on positions ``0..size-1`` and ``offsets[position]`` translates them
+    into the backend's own address of the paragraph, a metadata row for FAISS or
+    a paragraph index for Memgraph. ``run_starts`` holds the first position of
+    every run in ascending order. ``groups`` optionally assigns each position an
+    embedding cluster, which diverse sampling spreads the windows over.
+    """
+
+    def __init__(
+        self,
+        offsets: Sequence[int],
+        run_starts: Sequence[int],
+        groups: Optional[Sequence[int]] = None,
+    ):
+        self.offsets = offsets
+        self.run_starts = list(run_starts) or [0]
+        self.groups = groups
+        self._members: Optional[Dict[int, List[int]]] = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def window(self, position: int, length: int) -> Tuple[int, int]:
+        """Return ``[start, end)`` of the window around ``position`` in its run."""
+        run = bisect.bisect_right(self.run_starts, position) - 1
+        run_start = self.run_starts[run]
+        if run + 1 < len(self.run_starts):
+            run_end = self.run_starts[run + 1]
+        else:
+            run_end = len(self)
+        start = max(run_start, min(position, run_end - length))
+        return start, min(run_end, start + length)
+
+    def _group_members(self) -> Dict[int, List[int]]:
+        if self._members is None:
+            members = {}
+            for position, group in enumerate(self.groups):
+                members.setdefault(int(group), []).append(position)
+            self._members = members
+        return self._members
+
+    def _starts(self, k: int, rng: random.Random, diverse: bool) -> List[int]:
+        if not diverse:
+            return rng.sample(range(len(self)), k)
+        if self.groups is not None:
+            # One start per cluster in turn, so no topic is drawn twice before
+            # every other one has been drawn once
+            members = list(self._group_members().values())
+            rng.shuffle(members)
+            return [rng.choice(members[i % len(members)]) for i in range(k)]
+        # Without clusters, spread the starts evenly over the category
+        bounds = [len(self) * i // k for i in range(k + 1)]
+        return [rng.randrange(low, high) for low, high in zip(bounds, bounds[1:])]
+
+    def sample_windows(
+        self,
+        k: int,
+        length: int = SAMPLE_WINDOW,
+        seed: Optional[int] = None,
+        diverse: bool = False,
+    ) -> List[Tuple[int, int]]:
+        """Draw up to ``k`` connected windows, merged and ordered by position.
+
+        Only the ``k`` drawn positions are touched, so the cost does not depend
+        on the size of the category. The same ``seed`` gives the same windows.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        rng = random.Random(seed)
+        windows = sorted(
+            self.window(position, length)
+            for position in self._starts(k, rng, diverse)
+        )
+
+        merged = [windows[0]]
+        for start, end in windows[1:]:
+            last_start, last_end = merged[-1]
+            # Overlapping windows always lie in the same run
+            if start < last_end:
+                merged[-1] = (last_start, max(last_end, end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def sample_offsets(self, k: int, **kwargs) -> List[int]:
+        return [
+            self.offsets[position]
+            for start, end in self.sample_windows(k, **kwargs)
+            for position in range(start, end)
+        ]
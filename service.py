@@ -0,0 +1,356 @@
+"""HTTP service exposing StorageController and LLMController.
+
+Run with:
+
+    uvicorn service:app --host 0.0.0.0 --port 8000
+
+and point the Streamlit app at it with ``KS_SERVICE_URL=http://localhost:8000``.
+Queries are plain endpoints served concurrently from the worker thread pool.
+Ingests are queued as background jobs and polled through ``/jobs/{job_id}``.
+Jobs live in the memory of one process, so scale query capacity with more
+replicas behind the same storage rather than with ``--workers``.
+"""
+
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from controller import LLMController, StorageController, get_ks_storage
+from profiling import profile_query
+
+
+class JobQueue:
+    """Runs long ingests on a small thread pool and tracks their status."""
+
+    def __init__(self, max_workers: int = 2, keep_seconds: float = 3600.0):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.keep_seconds = keep_seconds
+
+    def _set(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, func, args, kwargs):
+        self._set(job_id, status="running", started_at=time.time())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._set(job_id, status="failed", error=str(e), finished_at=time.time())
+            return
+        self._set(job_id, status="done", result=result, finished_at=time.time())
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.get("finished_at") and job["finished_at"] < cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, kind: str, func, *args, **kwargs) -> str:
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "result": None,
+                "error": None,
+            }
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class WikipediaIngestRequest(BaseModel):
+    category: str
+    save_as_category: str = ""
+    lang_prefix: str = "en"
+    mode: str = "replace"
+    method: str = "quick"
+    section_filter: Optional[str] = None
+    offline: bool = False
+
+
+class WikipediaSyncRequest(BaseModel):
+    category: str
+    save_as_category: str = ""
+    lang_prefix: str = "en"
+    section_filter: Optional[str] = None
+    offline: bool = False
+
+
+class TextIngestRequest(BaseModel):
+    category: str
+    text: str
+    lang_prefix: str = "custom"
+    mode: str = "append"
+
+
+class SearchRequest(BaseModel):
+    category: str
+    question: str
+    n: int = 10
+    window: int = 0
+
+
+class AnswerRequest(BaseModel):
+    question: str
+    context: List[str]
+    lang_prefix: str = "en"
+    # Only describes the category in the slow-query log
+    category: Optional[str] = None
+
+
+class ChatRequest(BaseModel):
+    category: str
+    question: str
+    n: int = 10
+    window: int = 0
+    lang_prefix: str = "en"
+
+
+class QuizRequest(BaseModel):
+    category: str
+    number_of_questions: int = 5
+    lang_prefix: str = "en"
+    better_explanation: str = "No specific kind."
+    diverse: bool = False
+    seed: Optional[int] = None
+
+
+controllers = {}
+jobs = JobQueue(max_workers=int(os.getenv("KS_INGEST_WORKERS", "2")))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    storage = get_ks_storage()
+    controllers["storage"] = StorageController(storage)
+    controllers["llm"] = LLMController(storage)
+    yield
+
+
+app = FastAPI(title="Knowledge search", lifespan=lifespan)
+
+
+# Endpoints are sync functions on purpose: FastAPI runs them in its thread
+# pool, so model inference and storage calls never block the event loop.
+
+
+@app.post("/users/{user_id}")
+def initialize_user(user_id: str):
+    controllers["storage"].initialize_user(user_id)
+    return {"user_id": user_id}
+
+
+@app.get("/users/{user_id}/categories")
+def get_all_categories(user_id: str):
+    return {"categories": controllers["storage"].get_all_categories(user_id)}
+
+
+@app.get("/users/{user_id}/categories/{category}/paragraphs")
+def get_all_paragraphs(user_id: str, category: str):
+    paragraphs = controllers["storage"].get_all_paragraphs_from_category(
+        user_id, category
+    )
+    return {"paragraphs": paragraphs}
+
+
+@app.delete("/users/{user_id}/categories/{category}/paragraphs/{paragraph_id}")
+def delete_paragraph(user_id: str, category: str, paragraph_id: str):
+    controllers["storage"].delete_paragraph(user_id, category, paragraph_id)
+    return {"deleted": paragraph_id}
+
+
+@app.post("/users/{user_id}/ingest/wikipedia", status_code=202)
+def ingest_wikipedia(user_id: str, request: WikipediaIngestRequest):
+    job_id = jobs.submit(
+        "ingest_wikipedia",
+        controllers["storage"].ingest_wikipedia,
+        user_id,
+        request.category,
+        request.save_as_category,
+        request.lang_prefix,
+        mode=request.mode,
+        method=request.method,
+        section_filter=request.section_filter,
+        offline=request.offline,
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/users/{user_id}/sync/wikipedia", status_code=202)
+def sync_wikipedia(user_id: str, request: WikipediaSyncRequest):
+    job_id = jobs.submit(
+        "sync_wikipedia",
+        controllers["storage"].sync_wikipedia,
+        user_id,
+        request.category,
+        request.save_as_category,
+        request.lang_prefix,
+        section_filter=request.section_filter,
+        offline=request.offline,
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/users/{user_id}/sync", status_code=202)
+def sync_all_wikipedia(user_id: str, offline: bool = False):
+    job_id = jobs.submit(
+        "sync_all_wikipedia",
+        controllers["storage"].sync_all_wikipedia,
+        user_id,
+        offline=offline,
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/users/{user_id}/ingest/text", status_code=202)
+def ingest_custom_text(user_id: str, request: TextIngestRequest):
+    job_id = jobs.submit(
+        "ingest_custom_text",
+        controllers["storage"].ingest_custom_text,
+        user_id,
+        request.category,
+        request.text,
+        lang_prefix=request.lang_prefix,
+        mode=request.mode,
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/users/{user_id}/categories/{category}/clusters", status_code=202)
+def cluster_category(user_id: str, category: str, n_clusters: Optional[int] = None):
+    job_id = jobs.submit(
+        "cluster_category",
+        controllers["storage"].cluster_category,
+        user_id,
+        category,
+        n_clusters=n_clusters,
+    )
+    return {"job_id": job_id}
+
+
+@app.get("/users/{user_id}/categories/{category}/clusters")
+def get_clusters(user_id: str, category: str):
+    return {"clusters": controllers["storage"].get_clusters(user_id, category)}
+
+
+@app.get("/users/{user_id}/categories/{category}/clusters/{cluster}/paragraphs")
+def get_cluster_paragraphs(
+    user_id: str, category: str, cluster: int, page: int = 0, page_size: int = 20
+):
+    paragraphs = controllers["storage"].get_cluster_paragraphs(
+        user_id, category, cluster, page=page, page_size=page_size
+    )
+    return {"paragraphs": paragraphs}
+
+
+@app.get("/users/{user_id}/export")
+def export_categories(user_id: str, category: List[str] = Query(default=[])):
+    categories = category or controllers["storage"].get_all_categories(user_id)
+    # Sent batch by batch as it is read, the export is never held whole
+    return StreamingResponse(
+        controllers["storage"].iter_export(user_id, categories),
+        media_type="application/vnd.apache.arrow.stream",
+    )
+
+
+@app.post("/users/{user_id}/import", status_code=202)
+async def import_paragraphs(
+    user_id: str, request: Request, mode: str = "replace", category: str = ""
+):
+    source = io.BytesIO(await request.body())
+    job_id = jobs.submit(
+        "import_paragraphs",
+        controllers["storage"].import_paragraphs,
+        user_id,
+        source,
+        mode=mode,
+        category=category or None,
+    )
+    return {"job_id": job_id}
+
+
+@app.get("/admin/slow-queries")
+def get_slow_queries(limit: int = 50, x_admin_token: str = Header(default="")):
+    try:
+        slow_queries = controllers["storage"].get_slow_queries(x_admin_token, limit)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return {"slow_queries": slow_queries}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+@app.post("/users/{user_id}/search")
+def get_similar_documents(user_id: str, request: SearchRequest):
+    with profile_query("search", user_id=user_id, category=request.category):
+        context = controllers["storage"].get_similar_documents(
+            user_id, request.category, request.question, request.n, request.window
+        )
+    return {"context": context}
+
+
+@app.post("/users/{user_id}/answer")
+def answer_question(user_id: str, request: AnswerRequest):
+    with profile_query("answer", user_id=user_id, category=request.category):
+        answer = controllers["llm"].answer_question_based_on_excerpts(
+            user_id,
+            request.question,
+            request.context,
+            request.lang_prefix,
+            category=request.category,
+        )
+    return {"answer": answer}
+
+
+@app.post("/users/{user_id}/chat")
+def chat(user_id: str, request: ChatRequest):
+    """Search and answer in one call, profiled as one chat turn."""
+    with profile_query("chat", user_id=user_id, category=request.category):
+        context = controllers["storage"].get_similar_documents(
+            user_id, request.category, request.question, request.n, request.window
+        )
+        answer = controllers["llm"].answer_question_based_on_excerpts(
+            user_id, request.question, context, request.lang_prefix
+        )
+    return {"context": context, "answer": answer}
+
+
+@app.post("/users/{user_id}/quiz")
+def generate_quiz(user_id: str, request: QuizRequest):
+    quiz = controllers["llm"].generate_quiz(
+        user_id,
+        request.category,
+        request.number_of_questions,
+        request.lang_prefix,
+        request.better_explanation,
+        diverse=request.diverse,
+        seed=request.seed,
+    )
+    return {"quiz": quiz}
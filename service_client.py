@@ -0,0 +1,273 @@
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+
+class JobFailedError(Exception):
+    pass
+
+
+class ServiceClient:
+    """Thin client for the HTTP service in ``service.py``.
+
+    Exposes the same methods as ``StorageController`` and ``LLMController``, so
+    the Streamlit app can use either. Ingests, syncs, imports and clustering are
+    submitted as jobs and return the job ID at once, to be followed with
+    ``get_job``. Scripts pass ``wait=True`` to block until the result is in.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 120.0,
+        poll_interval: float = 0.5,
+        job_timeout: float = 1800.0,
+    ):
+        self._client = httpx.Client(base_url=base_url, timeout=timeout)
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+
+    def _get(self, path: str, **kwargs) -> Dict:
+        response = self._client.get(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, path: str, payload: Optional[Dict] = None) -> Dict:
+        response = self._client.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def get_job(self, job_id: str) -> Dict:
+        return self._get(f"/jobs/{job_id}")
+
+    def _job_result(self, job_id: str, wait: bool):
+        return self.wait_for_job(job_id) if wait else job_id
+
+    def wait_for_job(self, job_id: str):
+        deadline = time.monotonic() + self.job_timeout
+        while time.monotonic() < deadline:
+            job = self.get_job(job_id)
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] == "failed":
+                raise JobFailedError(job["error"])
+            time.sleep(self.poll_interval)
+        raise TimeoutError(f"Job '{job_id}' did not finish in {self.job_timeout}s")
+
+    # --- StorageController ---
+
+    def initialize_user(self, user_id: str):
+        self._post(f"/users/{user_id}")
+
+    def get_all_categories(self, user_id: str) -> List[str]:
+        return self._get(f"/users/{user_id}/categories")["categories"]
+
+    def submit_wikipedia_ingest(
+        self,
+        user_id,
+        category,
+        save_as_category,
+        lang_prefix,
+        mode="replace",
+        method="quick",
+        section_filter=None,
+        offline=False,
+    ) -> str:
+        payload = {
+            "category": category,
+            "save_as_category": save_as_category,
+            "lang_prefix": lang_prefix,
+            "mode": mode,
+            "method": method,
+            "section_filter": section_filter,
+            "offline": offline,
+        }
+        return self._post(f"/users/{user_id}/ingest/wikipedia", payload)["job_id"]
+
+    def ingest_wikipedia(
+        self, user_id, category, save_as_category, lang_prefix, wait=False, **kw
+    ):
+        job_id = self.submit_wikipedia_ingest(
+            user_id, category, save_as_category, lang_prefix, **kw
+        )
+        return self._job_result(job_id, wait)
+
+    def sync_wikipedia(
+        self,
+        user_id,
+        category,
+        save_as_category,
+        lang_prefix,
+        section_filter=None,
+        offline=False,
+        wait=False,
+    ):
+        payload = {
+            "category": category,
+            "save_as_category": save_as_category,
+            "lang_prefix": lang_prefix,
+            "section_filter": section_filter,
+            "offline": offline,
+        }
+        job_id = self._post(f"/users/{user_id}/sync/wikipedia", payload)["job_id"]
+        return self._job_result(job_id, wait)
+
+    def sync_all_wikipedia(self, user_id: str, offline=False, wait=False):
+        response = self._client.post(
+            f"/users/{user_id}/sync", params={"offline": offline}
+        )
+        response.raise_for_status()
+        return self._job_result(response.json()["job_id"], wait)
+
+    def submit_text_ingest(
+        self, user_id: str, category, paragraph, lang_prefix="custom", mode="append"
+    ) -> str:
+        payload = {
+            "category": category,
+            "text": paragraph,
+            "lang_prefix": lang_prefix,
+            "mode": mode,
+        }
+        return self._post(f"/users/{user_id}/ingest/text", payload)["job_id"]
+
+    def ingest_custom_text(self, user_id: str, category, paragraph, wait=False, **kw):
+        job_id = self.submit_text_ingest(user_id, category, paragraph, **kw)
+        return self._job_result(job_id, wait)
+
+    def get_all_paragraphs_from_category(self, user_id: str, category: str):
+        path = f"/users/{user_id}/categories/{category}/paragraphs"
+        return self._get(path)["paragraphs"]
+
+    def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
+        path = f"/users/{user_id}/categories/{category}/paragraphs/{paragraph_id}"
+        response = self._client.delete(path)
+        response.raise_for_status()
+
+    def get_similar_documents(
+        self, user_id: str, category: str, question: str, n: int, window: int = 0
+    ) -> List[str]:
+        payload = {"category": category, "question": question, "n": n, "window": window}
+        return self._post(f"/users/{user_id}/search", payload)["context"]
+
+    def cluster_category(
+        self,
+        user_id: str,
+        category: str,
+        n_clusters: Optional[int] = None,
+        wait=False,
+    ):
+        params = {"n_clusters": n_clusters} if n_clusters else {}
+        response = self._client.post(
+            f"/users/{user_id}/categories/{category}/clusters", params=params
+        )
+        response.raise_for_status()
+        return self._job_result(response.json()["job_id"], wait)
+
+    def get_clusters(self, user_id: str, category: str):
+        return self._get(f"/users/{user_id}/categories/{category}/clusters")[
+            "clusters"
+        ]
+
+    def get_cluster_paragraphs(
+        self, user_id: str, category: str, cluster: int, page=0, page_size=20
+    ):
+        path = f"/users/{user_id}/categories/{category}/clusters/{cluster}/paragraphs"
+        params = {"page": page, "page_size": page_size}
+        return self._get(path, params=params)["paragraphs"]
+
+    def export_categories(self, user_id: str, categories: List[str], sink) -> int:
+        written = 0
+        with self._client.stream(
+            "GET", f"/users/{user_id}/export", params={"category": categories}
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                sink.write(chunk)
+                written += len(chunk)
+        return written
+
+    def import_paragraphs(
+        self,
+        user_id: str,
+        source,
+        mode="replace",
+        category: Optional[str] = None,
+        wait=False,
+    ):
+        data = source.read() if hasattr(source, "read") else source
+        response = self._client.post(
+            f"/users/{user_id}/import",
+            params={"mode": mode, "category": category or ""},
+            content=data,
+        )
+        response.raise_for_status()
+        return self._job_result(response.json()["job_id"], wait)
+
+    def get_slow_queries(self, admin_token: str, limit: int = 50) -> List[Dict]:
+        response = self._client.get(
+            "/admin/slow-queries",
+            params={"limit": limit},
+            headers={"X-Admin-Token": admin_token},
+        )
+        if response.status_code == 403:
+            raise PermissionError(response.json()["detail"])
+        response.raise_for_status()
+        return response.json()["slow_queries"]
+
+    # --- LLMController ---
+
+    def answer_question_based_on_excerpts(
+        self,
+        user_id: str,
+        question: str,
+        context: List[str],
+        lang_prefix: str,
+        category: Optional[str] = None,
+    ) -> str:
+        payload = {
+            "question": question,
+            "context": context,
+            "lang_prefix": lang_prefix,
+            "category": category,
+        }
+        return self._post(f"/users/{user_id}/answer", payload)["answer"]
+
+    def chat(
+        self,
+        user_id: str,
+        category: str,
+        question: str,
+        n: int,
+        window: int,
+        lang_prefix: str,
+    ) -> Dict:
+        """Search and answer in one request, returns the context and answer."""
+        payload = {
+            "category": category,
+            "question": question,
+            "n": n,
+            "window": window,
+            "lang_prefix": lang_prefix,
+        }
+        return self._post(f"/users/{user_id}/chat", payload)
+
+    def generate_quiz(
+        self,
+        user_id: str,
+        category: str,
+        number_of_questions: int,
+        lang_prefix: str,
+        better_explanation: str,
+        diverse: bool = False,
+        seed: Optional[int] = None,
+    ):
+        payload = {
+            "category": category,
+            "number_of_questions": number_of_questions,
+            "lang_prefix": lang_prefix,
+            "better_explanation": better_explanation,
+            "diverse": diverse,
+            "seed": seed,
+        }
+        return self._post(f"/users/{user_id}/quiz", payload)["quiz"]
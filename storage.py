@@ -1,35 +1,219 @@
-from abc import ABC
-from typing import List
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, TypedDict
+
+# Clusters are dropped once more than this share of a category's paragraphs
+# was added after clustering, see clustering.py
+CLUSTER_STALE_FRACTION = 0.2
+
+
+class SimilarDocument(TypedDict):
+    content: str
+    similarity: float
+
+
+class ContextPassage(TypedDict):
+    content: str
+    similarity: float
+    ids: List[str]
+
+
+class Paragraph(TypedDict):
+    id: str
+    content: str
+
+
+class SampledParagraph(TypedDict):
+    content: str
+
+
+class ClusterSummary(TypedDict):
+    """One k-means cluster, ``cluster`` is -1 for paragraphs added since."""
+
+    cluster: int
+    size: int
+    preview: str
+
+
+class CategoryStats(TypedDict):
+    paragraphs: int
+    index_type: str
+
+
+class ParagraphRecord(TypedDict):
+    """A stored paragraph with its vector, as streamed for export."""
+
+    id: str
+    content: str
+    position: int
+    run_start: bool
+    lang_prefix: str
+    section: Optional[str]
+    vector: List[float]
+
+
+def merge_windows(windows: List[Dict]) -> List[ContextPassage]:
+    """Merge context windows that share paragraphs into single passages.
+
+    Each window is a dict with a ``similarity`` score and a ``paragraphs`` list of
+    ``(id, position, content)`` tuples. Windows that overlap are unioned and
+    ordered by position; passages are returned best-first.
+    """
+    groups = []
+    for window in sorted(windows, key=lambda w: w["similarity"], reverse=True):
+        ids = {paragraph_id for paragraph_id, _, _ in window["paragraphs"]}
+        merged = {"similarity": window["similarity"], "paragraphs": {}}
+        for paragraph_id, position, content in window["paragraphs"]:
+            merged["paragraphs"][paragraph_id] = (position, content)
+
+        remaining = []
+        for group in groups:
+            if ids.isdisjoint(group["paragraphs"]):
+                remaining.append(group)
+                continue
+            merged["similarity"] = max(merged["similarity"], group["similarity"])
+            merged["paragraphs"].update(group["paragraphs"])
+            ids.update(group["paragraphs"])
+        remaining.append(merged)
+        groups = remaining
+
+    passages = []
+    for group in sorted(groups, key=lambda g: g["similarity"], reverse=True):
+        ordered = sorted(group["paragraphs"].items(), key=lambda item: item[1][0])
+        passages.append(
+            {
+                "content": "\n\n".join(content for _, (_, content) in ordered),
+                "similarity": group["similarity"],
+                "ids": [paragraph_id for paragraph_id, _ in ordered],
+            }
+        )
+    return passages
 
 
 class Storage(ABC):
+    """Interface shared by the FAISS and Memgraph backends.
+
+    Results are plain dicts shaped like the ``TypedDict`` records above, so
+    callers index them with ``result["content"]`` whichever backend is used.
+    Vectors are always computed by the caller, storages never encode text.
+    """
+
+    @abstractmethod
     def initialize_user(self, user_id: str):
         pass
 
-    def get_all_categories(self, user_id: str):
+    @abstractmethod
+    def get_all_categories(self, user_id: str) -> List[str]:
         pass
 
-    def ingest_category(self, user_id: str):
+    @abstractmethod
+    def ingest_paragraphs(
+        self,
+        user_id: str,
+        category: str,
+        paragraphs: List[str],
+        embeddings: List,
+        lang_prefix: str,
+        mode: str,
+        ids: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None,
+    ) -> int:
+        """Store paragraphs as one connected run, ``mode`` is replace or append.
+
+        ``sections`` optionally gives the section path of every paragraph.
+        """
+
+    @abstractmethod
+    def get_similar_documents(
+        self, user_id: str, category: str, query_vector: List[float], n: int
+    ) -> List[SimilarDocument]:
+        pass
+
+    @abstractmethod
+    def get_similar_documents_with_context(
+        self,
+        user_id: str,
+        category: str,
+        query_vector: List[float],
+        n: int,
+        window: int,
+    ) -> List[ContextPassage]:
         pass
 
-    def get_similar_documents(self, user_id: str, category: str, question: str, n: int):
+    @abstractmethod
+    def get_paragraph_ids(self, user_id: str, category: str) -> List[str]:
         pass
 
-    def get_paragraph_ids(self, user_id: str, category: str):
+    @abstractmethod
+    def get_all_paragraphs(self, user_id: str, category: str) -> List[Paragraph]:
         pass
 
+    @abstractmethod
     def sample_n_connected_paragraphs(
-        self, user_id: str, category: str, number_of_questions: int
-    ):
+        self,
+        user_id: str,
+        category: str,
+        number_of_questions: int,
+        seed: Optional[int] = None,
+        diverse: bool = False,
+    ) -> Optional[List[SampledParagraph]]:
+        """Connected windows for quiz generation, ``None`` when there are none.
+
+        The same ``seed`` draws the same windows, ``diverse`` spreads them over
+        different regions of the category instead of drawing uniformly.
+        """
+
+    @abstractmethod
+    def iter_paragraph_records(
+        self, user_id: str, category: str, batch_size: int = 1024
+    ) -> Iterator[List[ParagraphRecord]]:
         pass
 
-    def ingest_paragraphs(
+    @abstractmethod
+    def delete_paragraph(self, user_id: str, category: str, paragraph_id: str):
+        pass
+
+    @abstractmethod
+    def delete_paragraphs(
+        self, user_id: str, category: str, paragraph_ids: List[str]
+    ) -> int:
+        """Delete many paragraphs at once, returning how many existed."""
+
+    @abstractmethod
+    def save_clusters(
         self,
         user_id: str,
         category: str,
-        paragraphs: List[str],
-        embeddings: List,
-        lang_prefix: str,
-        mode: str,
+        centroids,
+        assignments: Dict[str, int],
+        representatives: List[str],
     ):
+        """Persist k-means centroids and the cluster of every paragraph.
+
+        ``representatives`` holds the paragraph id closest to each centroid.
+        """
+
+    @abstractmethod
+    def get_clusters(
+        self, user_id: str, category: str
+    ) -> Optional[List[ClusterSummary]]:
+        pass
+
+    @abstractmethod
+    def get_cluster_paragraphs(
+        self, user_id: str, category: str, cluster: int, offset: int, limit: int
+    ) -> List[Paragraph]:
         pass
+
+    @abstractmethod
+    def describe_category(
+        self, user_id: str, category: str
+    ) -> Optional[CategoryStats]:
+        """Size and index type of a category, as attached to slow-query logs."""
+
+    @abstractmethod
+    def get_sync_state(self, user_id: str, category: str) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    def set_sync_state(self, user_id: str, category: str, state: Dict):
+        """Keep a small JSON-serialisable record of where the category came from."""
@@ -0,0 +1,66 @@
+"""Clustering a small synthetic category on the FAISS storage."""
+
+import numpy as np
+import pytest
+
+from clustering import cluster_category
+from faiss_storage import FaissStorage
+
+DIMENSION = 8
+# A few far apart topics, so k-means has something to find
+CENTERS = np.random.default_rng(0).standard_normal((3, DIMENSION)) * 10
+
+
+def blobs(seed, count):
+    rng = np.random.default_rng(seed)
+    labels = np.arange(count) % len(CENTERS)
+    noise = rng.standard_normal((count, DIMENSION)) * 0.05
+    return (CENTERS[labels] + noise).astype("float32")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = FaissStorage(index_dir=str(tmp_path))
+    paragraphs = [f"Paragraph {i}" for i in range(60)]
+    storage.ingest_paragraphs(
+        "user", "Topics", paragraphs, blobs(0, 60), "en", "replace"
+    )
+    return storage
+
+
+def test_cluster_sizes_follow_deletes(storage):
+    assert cluster_category(storage, "user", "Topics", n_clusters=3) == {
+        "clusters": 3,
+        "paragraphs": 60,
+    }
+    ids = storage.get_paragraph_ids("user", "Topics")
+    storage.delete_paragraphs("user", "Topics", ids[:5])
+
+    clusters = storage.get_clusters("user", "Topics")
+    assert [c["cluster"] for c in clusters] == [0, 1, 2]
+    assert sum(c["size"] for c in clusters) == 55
+
+
+def test_cluster_paragraphs_are_paged(storage):
+    cluster_category(storage, "user", "Topics", n_clusters=3)
+    cluster = storage.get_clusters("user", "Topics")[0]
+
+    members = storage.get_cluster_paragraphs("user", "Topics", 0, 0, 100)
+    assert len(members) == cluster["size"]
+    assert cluster["preview"] in [p["content"] for p in members]
+    page = storage.get_cluster_paragraphs("user", "Topics", 0, 5, 5)
+    assert page == members[5:10]
+
+
+def test_appends_make_clusters_stale(storage):
+    cluster_category(storage, "user", "Topics", n_clusters=3)
+
+    new = ["New 0", "New 1"]
+    storage.ingest_paragraphs("user", "Topics", new, blobs(1, 2), "en", "append")
+    clusters = storage.get_clusters("user", "Topics")
+    assert clusters[0] == {"cluster": -1, "size": 2, "preview": "New 0"}
+
+    # 22 of 82 paragraphs unassigned is past CLUSTER_STALE_FRACTION
+    more = [f"More {i}" for i in range(20)]
+    storage.ingest_paragraphs("user", "Topics", more, blobs(2, 20), "en", "append")
+    assert storage.get_clusters("user", "Topics") is None
@@ -0,0 +1,45 @@
+"""Runs the shared checks from ``benchmarks/storage_conformance.py``.
+
+FAISS always runs. Memgraph is skipped unless ``gqlalchemy`` is installed and a
+server is reachable. The timing budgets are scaled to the small sizes used here
+and marked ``perf``, ``pytest -m "not perf"`` leaves them out on a loaded box.
+"""
+
+import pytest
+
+from benchmarks.storage_conformance import (
+    Checker,
+    check_budgets,
+    check_correctness,
+    make_storage,
+    measure,
+    scaled_budgets,
+)
+
+DIMENSION = 32
+
+
+@pytest.fixture(scope="module", params=["faiss", "memgraph"])
+def storage(request):
+    if request.param == "memgraph":
+        pytest.importorskip("gqlalchemy")
+    try:
+        return make_storage(request.param)
+    except Exception as e:
+        pytest.skip(f"{request.param} is not available: {e}")
+
+
+@pytest.mark.parametrize("size", [100, 1000])
+def test_conformance(storage, size):
+    checker = Checker(f"{type(storage).__name__}/{size}")
+    check_correctness(storage, checker, size, DIMENSION)
+    assert not checker.failures, "\n".join(checker.failures)
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("size", [1000, 2000])
+def test_faiss_budgets(size):
+    checker = Checker(f"faiss/{size}")
+    stats = measure(make_storage("faiss"), size, DIMENSION, queries=50)
+    check_budgets(stats, scaled_budgets("faiss", size), checker)
+    assert not checker.failures, "\n".join(checker.failures)
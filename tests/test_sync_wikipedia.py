@@ -0,0 +1,82 @@
+"""``sync_wikipedia`` must only ever delete paragraphs it synced itself."""
+
+import numpy as np
+import pytest
+
+import controller
+from faiss_storage import FaissStorage
+
+DIMENSION = 16
+
+
+class FakeEmbeddingGenerator:
+    def warm_up(self):
+        return None
+
+    def get_embeddings(self, paragraphs):
+        seeds = [int(controller.content_hash(text), 16) for text in paragraphs]
+        vectors = [np.random.default_rng(seed).random(DIMENSION) for seed in seeds]
+        return np.array(vectors, dtype="float32")
+
+
+class FakePageProcessor:
+    def __init__(self, chunks, revid=1):
+        self.chunks = chunks
+        self.revid = revid
+
+    def chunk_page(self, category, lang_prefix, section_filter, offline=False):
+        return self.revid, [("Intro", chunk) for chunk in self.chunks]
+
+
+@pytest.fixture
+def storage_controller(tmp_path, monkeypatch):
+    monkeypatch.setattr(controller, "EmbeddingGenerator", FakeEmbeddingGenerator)
+    monkeypatch.setattr(
+        controller, "get_ks_storage", lambda: FaissStorage(index_dir=str(tmp_path))
+    )
+    return controller.StorageController()
+
+
+def contents(storage_controller, category):
+    return [
+        p["content"]
+        for p in storage_controller._storage.get_all_paragraphs("user", category)
+    ]
+
+
+def test_sync_keeps_custom_text(storage_controller):
+    storage_controller.ingest_custom_text(
+        "user", "Notes", "First note.\n\nSecond note."
+    )
+    storage_controller._processors["detailed"] = FakePageProcessor(["Page chunk."])
+
+    result = storage_controller.sync_wikipedia("user", "Page", "Notes", "en")
+
+    assert result["removed"] == 0 and result["added"] == 1
+    assert sorted(contents(storage_controller, "Notes")) == [
+        "First note.",
+        "Page chunk.",
+        "Second note.",
+    ]
+
+
+def test_sync_never_deletes_legacy_paragraphs(storage_controller):
+    storage = storage_controller._storage
+    texts = ["Old chunk.", "Kept chunk."]
+    embeddings = FakeEmbeddingGenerator().get_embeddings(texts)
+    storage.ingest_paragraphs("user", "Legacy", texts, embeddings, "en", "replace")
+    storage_controller._processors["detailed"] = FakePageProcessor(
+        ["Kept chunk.", "New chunk."], revid=2
+    )
+
+    result = storage_controller.sync_wikipedia("user", "Page", "Legacy", "en")
+
+    assert result == {"revid": 2, "added": 1, "removed": 0, "unchanged": 1}
+    assert sorted(contents(storage_controller, "Legacy")) == [
+        "Kept chunk.",
+        "New chunk.",
+        "Old chunk.",
+    ]
+    # Only what matched or was added belongs to the page from now on
+    source = storage.get_sync_state("user", "Legacy")["sources"]["en:Page:"]
+    assert len(source["ids"]) == 2
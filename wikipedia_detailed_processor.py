@@ -1,56 +1,48 @@
-import wikipediaapi
+from typing import List, Optional, Tuple
+
+from chunking import iter_chunks, section_label
 from embeddings import EmbeddingGenerator
+from wikipedia_pages import WikipediaPages
 
 
 class DetailedWikipediaProcessor:
-    def __init__(self):
-        self._wiki = wikipediaapi.Wikipedia(
-            language="en",
-            user_agent='user_agent="WikiReaderBot/1.0 (mrdjen.josip@gmail.com)',
-            extract_format=wikipediaapi.ExtractFormat.WIKI
-        )
+    def __init__(self, pages: Optional[WikipediaPages] = None):
+        self._pages = pages or WikipediaPages()
         self._embeddings_generator = EmbeddingGenerator()
 
-    def _extract_paragraphs(self, section, min_length=40) -> list[str]:
-        paragraphs = []
-        if len(section.text.strip()) > min_length:
-            paragraphs.extend(
-                [
-                    p.strip()
-                    for p in section.text.split("\n")
-                    if len(p.strip()) > min_length
-                ]
-            )
-        for sub_section in section.sections:
-            paragraphs.extend(self._extract_paragraphs(sub_section))
-        return paragraphs
+    def chunk_page(
+        self,
+        category: str,
+        language_prefix: str = "en",
+        section_filter: str = None,
+        offline: bool = False,
+    ) -> Tuple[Optional[int], List[Tuple[str, str]]]:
+        """Return the page's revision ID and its ``(section, chunk)`` pairs."""
+        page = self._pages.fetch(category, language_prefix, offline=offline)
+        if page is None:
+            print(f"❌ Page '{category}' does not exist.")
+            return None, []
+
+        chunks = [
+            (section_label(path), chunk)
+            for path, chunk in iter_chunks(page["tree"], section_filter)
+        ]
+        if section_filter and not chunks:
+            print(f"⚠️ Section '{section_filter}' not found.")
+        return page["revid"], chunks
 
     def process_detailed_sections(
-        self, category: str, language_prefix: str = "en", section_filter: str = None
+        self,
+        category: str,
+        language_prefix: str = "en",
+        section_filter: str = None,
+        offline: bool = False,
     ):
-        self._wiki = wikipediaapi.Wikipedia(
-            language="en",
-            user_agent='user_agent="WikiReaderBot/1.0 (mrdjen.josip@gmail.com)',
-            extract_format=wikipediaapi.ExtractFormat.WIKI
-        )
-        page = self._wiki.page(category)
-
-        if not page.exists():
-            print(f"❌ Page '{category}' does not exist.")
-            return [], []
-
-        if section_filter:
-            # Only grab sections that match the filter
-            for section in page.sections:
-                if section.title.lower() == section_filter.lower():
-                    paragraphs = self._extract_paragraphs(section)
-                    break
-            else:
-                print(f"⚠️ Section '{section_filter}' not found.")
-                return [], []
-        else:
-            # Grab all content recursively
-            paragraphs = self._extract_paragraphs(page)
+        _, chunks = self.chunk_page(category, language_prefix, section_filter, offline)
+        if not chunks:
+            return [], [], []
 
+        sections = [section for section, _ in chunks]
+        paragraphs = [chunk for _, chunk in chunks]
         embeddings = self._embeddings_generator.get_embeddings(paragraphs)
-        return paragraphs, embeddings
+        return paragraphs, embeddings, sections
@@ -0,0 +1,100 @@
+"""Fetching Wikipedia pages through a persistent on-disk cache.
+
+Pages are stored as section trees (see ``chunking.page_tree``) under
+``<cache_dir>/<lang>/<title hash>/<revid>.json``. A ``latest.json`` next to them
+names the newest cached revision, so a page can be re-chunked or filtered by
+section without going to Wikipedia at all.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from chunking import page_tree
+from locking import atomic_write_json
+
+USER_AGENT = "WikiReaderBot/1.0 (mrdjen.josip@gmail.com)"
+
+
+class PageCache:
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or os.getenv(
+            "KS_WIKIPEDIA_CACHE_DIR", "wikipedia_cache"
+        )
+
+    def _page_dir(self, title: str, lang: str) -> str:
+        # Titles may contain slashes and other characters unsafe in paths
+        key = hashlib.sha1(title.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.cache_dir, lang, key)
+
+    def get(self, title: str, lang: str, revid: Optional[int] = None) -> Optional[Dict]:
+        """Return the cached page at ``revid``, or the newest one without it."""
+        page_dir = self._page_dir(title, lang)
+        try:
+            if revid is None:
+                with open(os.path.join(page_dir, "latest.json")) as f:
+                    revid = json.load(f)["revid"]
+            with open(os.path.join(page_dir, f"{revid}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, title: str, lang: str, revid: int, tree: Dict) -> Dict:
+        page_dir = self._page_dir(title, lang)
+        os.makedirs(page_dir, exist_ok=True)
+        page = {"title": title, "lang": lang, "revid": revid, "tree": tree}
+        atomic_write_json(os.path.join(page_dir, f"{revid}.json"), page)
+        atomic_write_json(os.path.join(page_dir, "latest.json"), {"revid": revid})
+        return page
+
+
+class WikipediaPages:
+    """One ``wikipediaapi`` client per language in front of a ``PageCache``."""
+
+    def __init__(self, cache: Optional[PageCache] = None):
+        self.cache = cache or PageCache()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, lang: str):
+        with self._lock:
+            if lang not in self._clients:
+                import wikipediaapi
+
+                self._clients[lang] = wikipediaapi.Wikipedia(
+                    language=lang,
+                    user_agent=USER_AGENT,
+                    extract_format=wikipediaapi.ExtractFormat.WIKI,
+                )
+            return self._clients[lang]
+
+    def fetch(
+        self, title: str, lang: str = "en", offline: bool = False
+    ) -> Optional[Dict]:
+        """Return ``{"title", "lang", "revid", "tree"}`` or ``None`` if missing.
+
+        Only the revision ID is asked for when the page is cached already. With
+        ``offline`` or when Wikipedia cannot be reached, the newest cached
+        revision is used.
+        """
+        lang = lang or "en"
+        if offline:
+            return self.cache.get(title, lang)
+
+        try:
+            page = self._client(lang).page(title)
+            if not page.exists():
+                return None
+            revid = page.lastrevid
+            cached = self.cache.get(title, lang, revid)
+            if cached is not None:
+                return cached
+            return self.cache.put(title, lang, revid, page_tree(page))
+        except OSError as e:
+            cached = self.cache.get(title, lang)
+            if cached is None:
+                raise
+            print(f"⚠️ Wikipedia unreachable ({e}), using cached '{title}'.")
+            return cached
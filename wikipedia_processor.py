@@ -1,4 +1,4 @@
-from llama_index.readers.wikipedia import WikipediaReader
+from chunking import iter_chunks, parse_headings, section_label
 from embeddings import EmbeddingGenerator
 
 class WikipediaProcessor:
@@ -6,10 +6,18 @@ class WikipediaProcessor:
         self._embeddings_generator = EmbeddingGenerator()
 
     def process_wikipedia_documents(self, category: str, language_prefix: str = ""):
+        from llama_index.readers.wikipedia import WikipediaReader
+
         reader = WikipediaReader()
         documents = reader.load_data(pages=[category], lang_prefix=language_prefix)
-        paragraphs = [p.strip() for doc in documents for p in doc.text.split('\n') if len(p.strip()) > 40]
+        # The page text keeps its "== Heading ==" lines, which give the sections
+        chunks = [
+            (section_label(path), chunk)
+            for doc in documents
+            for path, chunk in iter_chunks(parse_headings(category, doc.text))
+        ]
+        sections = [section for section, _ in chunks]
+        paragraphs = [chunk for _, chunk in chunks]
         embeddings = self._embeddings_generator.get_embeddings(paragraphs)
         
-        return paragraphs, embeddings
-
+        return paragraphs, embeddings, sections